@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+optional activity columns: commits in the last 30 days, latest release date
+and mentionable users (people who committed, commented or were assigned)
+
+repos are looked up in batches of aliased repository(...) fields, 50 per
+GraphQL request, and every result is cached per repo for a day, so the
+columns add a couple of requests per list instead of one per repo
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from common import get_graphql_data
+
+ACTIVITY_FIELDS = """
+        defaultBranchRef {
+            target {
+                ... on Commit {
+                    history(since: "%s") {
+                        totalCount
+                    }
+                }
+            }
+        }
+        latestRelease {
+            publishedAt
+        }
+        mentionableUsers {
+            totalCount
+        }"""
+ACTIVITY_KEYS = ("commits_30d", "latest_release", "mentionable_users")
+
+
+def owner_and_name(repo):
+    # "https://github.com/owner/name" -> ("owner", "name")
+    owner, name = repo["html_url"].rstrip("/").split("/")[-2:]
+    return owner, name
+
+
+def parse_activity(node):
+    if node is None:  # renamed, deleted or private since the search
+        return {key: None for key in ACTIVITY_KEYS}
+    branch = node.get("defaultBranchRef") or {}
+    history = (branch.get("target") or {}).get("history") or {}
+    release = node.get("latestRelease") or {}
+    return {
+        "commits_30d": history.get("totalCount"),
+        "latest_release": release.get("publishedAt"),
+        "mentionable_users": node["mentionableUsers"]["totalCount"],
+    }
+
+
+class ActivityFetcher(object):
+    def __init__(self, cache_path="../Data/activity-cache.json", ttl=24 * 3600, batch_size=50, days=30):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.days = days
+        self.cache = {}  # "owner/name" -> {"fetched_at", **activity}
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def build_query(self, repos):
+        # whole days, so the same batch gives the same query text all day
+        since = (datetime.utcnow() - timedelta(days=self.days)).strftime("%Y-%m-%dT00:00:00Z")
+        fields = ACTIVITY_FIELDS % since
+        parts = []
+        for i, repo in enumerate(repos):
+            owner, name = owner_and_name(repo)
+            parts.append(
+                "r%d: repository(owner: %s, name: %s) {%s\n    }"
+                % (i, json.dumps(owner), json.dumps(name), fields)
+            )
+        return "query{\n    " + "\n    ".join(parts) + "\n}"
+
+    def fetch(self, repos):
+        """
+        fetch activity of repos not cached or older than ttl, batch_size per request
+        """
+        now = time.time()
+        stale = []
+        seen = set()
+        for repo in repos:
+            key = "/".join(owner_and_name(repo)).lower()
+            entry = self.cache.get(key)
+            if key not in seen and (entry is None or now - entry["fetched_at"] > self.ttl):
+                stale.append(repo)
+                seen.add(key)
+        for start in range(0, len(stale), self.batch_size):
+            batch = stale[start : start + self.batch_size]
+            result = get_graphql_data(self.build_query(batch))
+            data = (result or {}).get("data")
+            if not data:
+                # request failed or errors only (RATE_LIMITED, timeout), nothing
+                # is cached so the batch is fetched again on the next run
+                print(f"Activity batch failed: {(result or {}).get('errors')}")
+                continue
+            for i, repo in enumerate(batch):
+                key = "/".join(owner_and_name(repo)).lower()
+                self.cache[key] = dict(parse_activity(data.get(f"r{i}")), fetched_at=now)
+        if stale:
+            print(f"Fetched activity of {len(stale)} repos in {-(-len(stale) // self.batch_size)} requests")
+            self.save()
+
+    def enrich(self, repos):
+        """
+        return copies of repos with the activity fields added
+        """
+        repos = list(repos)
+        self.fetch(repos)
+        enriched = []
+        for repo in repos:
+            entry = self.cache.get("/".join(owner_and_name(repo)).lower(), {})
+            enriched.append(dict(repo, **{key: entry.get(key) for key in ACTIVITY_KEYS}))
+        return enriched
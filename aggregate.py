@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+country x language x owner type cubes over every ranking list
+one long frame (one row per repo per list) is grouped once, every report
+table is a marginal of that cube instead of a separate README scrape.
+a repo can be in several lists, so tables across lists come from a second
+cube with one row per repo, the per list cube only feeds the pivots by list
+"""
+import os
+import re
+
+OWNER_LINK_RE = re.compile(r"\]\(https://github.com/([^/)]+)/")
+DIMENSIONS = ["item", "language", "country", "owner_type"]
+REPO_DIMENSIONS = DIMENSIONS[1:]
+
+
+def load_owner_map(md_paths):
+    """
+    owner login -> {"type", "country"} from enriched ranking tables
+    """
+    from readme_doc import iter_tables
+
+    owners = {}
+    for path in md_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            tables = iter_tables(f.read())
+        for table in tables:
+            projects = table.column("Project Name")
+            types = table.column("Owner Type")
+            countries = table.column("Country")
+            if projects is None or countries is None:
+                continue
+            types = types or [""] * len(projects)
+            for project, owner_type, country in zip(projects, types, countries):
+                m = OWNER_LINK_RE.search(project)
+                if m:
+                    owners[m.group(1)] = {"type": owner_type, "country": country}
+    return owners
+
+
+def frame_from_repo_list(repo_list):
+    """
+    long frame from WriteFile.repo_list, one row per repo per list
+    """
+    import pandas as pd
+
+    rows = []
+    for repo in repo_list:
+        for data in repo["data"]:
+            rows.append(
+                (
+                    repo["item"],
+                    data.get("language"),
+                    data["owner"]["login"],
+                    data["html_url"],
+                    data["stargazers_count"],
+                )
+            )
+    return pd.DataFrame(rows, columns=["item", "language", "username", "repo_url", "stars"])
+
+
+def frame_from_snapshot(path):
+    # same long frame from a saved Data/github-ranking-*.csv
+    import pandas as pd
+
+    return pd.read_csv(path, usecols=["item", "language", "username", "repo_url", "stars"])
+
+
+def attach_owners(frame, owners):
+    # owner country / type columns from load_owner_map
+    import pandas as pd
+
+    owner_df = pd.DataFrame.from_dict(owners, orient="index", columns=["type", "country"])
+    return frame.assign(
+        language=frame["language"].fillna("None"),
+        # empty cells are owners enrichment could not resolve
+        country=frame["username"].map(owner_df["country"]).replace("", None).fillna("Unknown"),
+        owner_type=frame["username"].map(owner_df["type"]).replace("", None).fillna("Unknown"),
+    )
+
+
+def build_cube(frame, owners):
+    """
+    attach owner country / type and group by every dimension at once
+    returns a frame indexed by DIMENSIONS with repos and stars columns,
+    a repo in several lists counts once per list
+    """
+    frame = attach_owners(frame, owners)
+    return frame.groupby(DIMENSIONS, sort=False).agg(
+        repos=("stars", "size"), stars=("stars", "sum")
+    )
+
+
+def build_repo_cube(frame, owners):
+    """
+    same cube without the list dimension, every repo counted once
+    indexed by REPO_DIMENSIONS
+    """
+    frame = attach_owners(frame.drop_duplicates("repo_url"), owners)
+    return frame.groupby(REPO_DIMENSIONS, sort=False).agg(
+        repos=("stars", "size"), stars=("stars", "sum")
+    )
+
+
+def rollup(cube, dims):
+    # marginal of the cube over `dims`, largest star total first
+    # use the repo cube unless dims include "item"
+    return cube.groupby(level=dims).sum().sort_values("stars", ascending=False)
+
+
+def pivot(cube, row, col="item", value="repos", top=15):
+    """
+    row x list table, e.g. country x (Python, Rust, ...) repo counts
+    """
+    table = cube[value].groupby(level=[row, col]).sum().unstack(col, fill_value=0)
+    order = table.sum(axis=1).sort_values(ascending=False).index[:top]
+    return table.loc[order]
+
+
+def to_markdown(df):
+    # plain markdown table, index included, no tabulate dependency
+    df = df.reset_index()
+    lines = [
+        "| " + " | ".join(str(c) for c in df.columns) + " |",
+        "| " + " | ".join("---" for _ in df.columns) + " |",
+    ]
+    for row in df.itertuples(index=False):
+        lines.append("| " + " | ".join(str(v).replace("|", "\\|") for v in row) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(cube, repo_cube, out_dir="../Data/aggregates", top=15):
+    """
+    write the cubes and their marginals as csv files plus one markdown report
+    cube: per list, from build_cube, repo_cube: per repo, from build_repo_cube
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    cube.to_csv(os.path.join(out_dir, "cube.csv"), encoding="utf-8")
+    repo_cube.to_csv(os.path.join(out_dir, "repo_cube.csv"), encoding="utf-8")
+    sections = [
+        ("Repositories per country and list", pivot(cube, "country", top=top)),
+        ("Stars per country and list", pivot(cube, "country", value="stars", top=top)),
+        ("Repositories per owner type and list", pivot(cube, "owner_type", top=top)),
+        ("Countries overall", rollup(repo_cube, ["country"]).head(top)),
+        ("Owner type by country", rollup(repo_cube, ["country", "owner_type"]).head(top)),
+        ("Languages by country", rollup(repo_cube, ["language", "country"]).head(top)),
+    ]
+    report = ["# Aggregations\n"]
+    for title, table in sections:
+        name = re.sub(r"\W+", "_", title.lower()).strip("_")
+        table.to_csv(os.path.join(out_dir, f"{name}.csv"), encoding="utf-8")
+        report.append(f"\n## {title}\n\n{to_markdown(table)}")
+    report_path = os.path.join(out_dir, "README.md")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("".join(report))
+    print(f"Save aggregation report to {report_path}")
+    return report_path
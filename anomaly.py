@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+star spike detection over the Data/*.csv snapshot history
+
+stars of every repo on every snapshot date form one date x repo matrix;
+daily star deltas are compared with a rolling median / MAD of the same
+repo's previous deltas. all repos and dates are handled by whole-frame
+pandas operations, there is no per-repo loop
+"""
+import os
+
+MAD_SCALE = 0.6745  # makes MAD comparable to a standard deviation
+FLAG_TEXT = "⚠️ star spike"
+
+
+def load_star_matrix(snapshots):
+    """
+    [(date, path)] -> frame indexed by date, one column of stars per repo url
+    rows copied from an older snapshot (refreshed=False) are left out, their
+    stars are not from that date, so no delta is taken across them
+    """
+    import pandas as pd
+
+    from snapshots import drop_reused
+
+    frames = []
+    for date, path in snapshots:
+        df = drop_reused(pd.read_csv(path, usecols=lambda c: c in ("repo_url", "stars", "refreshed")))
+        df["date"] = date
+        frames.append(df)
+    history = pd.concat(frames, ignore_index=True)
+    matrix = history.pivot_table(index="date", columns="repo_url", values="stars", aggfunc="max")
+    matrix.index = pd.to_datetime(matrix.index)
+    return matrix.sort_index()
+
+
+def detect_spikes(matrix, window=28, min_periods=7, threshold=6.0, min_delta=50):
+    """
+    flag (date, repo) whose per-day star delta has a robust z-score above
+    threshold against the previous `window` deltas of that repo
+    deltas run between a repo's own consecutive observations, so a repo only
+    sampled weekly (its reused rows are NaN) still gets one delta per week
+    min_delta drops tiny repos whose quiet baseline makes any gain look huge
+    returns a long frame: date, repo_url, delta, median, mad, z
+    """
+    history = matrix.stack().dropna().rename("stars").reset_index()
+    history.columns = ["date", "repo_url", "stars"]
+    history = history.sort_values(["repo_url", "date"], ignore_index=True)
+    repos = history.groupby("repo_url")
+    # stars per day since the repo's previous observation
+    history["delta"] = repos["stars"].diff() / repos["date"].diff().dt.days
+
+    def rolling_median(values):
+        per_repo = values.groupby(history["repo_url"]).rolling(window, min_periods=min_periods)
+        return per_repo.median().reset_index(level=0, drop=True)
+
+    previous = history.groupby("repo_url")["delta"].shift(1)
+    history["median"] = rolling_median(previous)
+    # rolling MAD approximated by the rolling median of deviations from the rolling median
+    history["mad"] = rolling_median((previous - history["median"]).abs())
+    history["z"] = MAD_SCALE * (history["delta"] - history["median"]) / history["mad"].clip(lower=1.0)
+
+    flagged = history[(history["z"] > threshold) & (history["delta"] >= min_delta)]
+    spikes = flagged.assign(date=flagged["date"].dt.strftime("%Y-%m-%d"))
+    spikes = spikes[["date", "repo_url", "delta", "median", "mad", "z"]].round(1)
+    return spikes.sort_values(["date", "z"], ascending=[False, False], ignore_index=True)
+
+
+def write_report(spikes, out_dir="../Data", top=100):
+    os.makedirs(out_dir, exist_ok=True)
+    spikes.to_csv(os.path.join(out_dir, "star-anomalies.csv"), index=False, encoding="utf-8")
+    lines = [
+        "# Star Anomalies\n",
+        "\nStar deltas far above the repo's own recent baseline (robust z-score).\n",
+        "\n| Date | Project | Stars/day | Baseline | MAD | z |",
+        "\n| ---- | ------- | --------- | -------- | --- | - |",
+    ]
+    for row in spikes.head(top).itertuples(index=False):
+        name = "/".join(row.repo_url.rstrip("/").split("/")[-2:])
+        lines.append(
+            f"\n| {row.date} | [{name}]({row.repo_url}) | {row.delta} | {row.median} | {row.mad} | {row.z} |"
+        )
+    report_path = os.path.join(out_dir, "star-anomalies.md")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("".join(lines) + "\n")
+    print(f"Save {len(spikes)} star anomalies to {report_path}")
+    return report_path
+
+
+def annotate_tables(text, flagged_urls):
+    """
+    set the Flags column of every ranking table in text, idempotent
+    """
+    from readme_doc import patch_tables
+
+    def annotate(table):
+        flags = []
+        for project in table.column("Project Name"):
+            url = project[project.find("](") + 2 : -1] if "](" in project else ""
+            flags.append(FLAG_TEXT if url in flagged_urls else "")
+        table.set_column("Flags", flags)
+
+    return patch_tables(text, annotate)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+columnar chart engine over the Data/*.csv snapshots and the enriched tables
+everything works on NumPy arrays: histogram binning, "Other" grouping and
+scatter decimation never loop over repos in Python
+"""
+import os
+
+import numpy as np
+
+from snapshots import list_snapshots
+
+DEFAULT_FORMATS = ("png", "svg")
+
+
+def load_snapshot(path, columns=("item", "repo_url", "stars", "forks", "language")):
+    """
+    read only the needed columns of one snapshot, as a dict of arrays
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=list(columns))
+    return {col: df[col].to_numpy() for col in columns}
+
+
+def load_history(snapshots, item="top-100-stars", columns=("language",)):
+    """
+    stack one list of many snapshots into a single frame with a date column
+    rows copied from an older snapshot (refreshed=False) are skipped
+    """
+    import pandas as pd
+
+    from snapshots import drop_reused
+
+    frames = []
+    wanted = {"item", "refreshed", *columns}
+    for date, path in snapshots:
+        df = drop_reused(pd.read_csv(path, usecols=lambda c: c in wanted))
+        df = df[df["item"] == item].drop(columns="item")
+        df["date"] = date
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["date", *columns])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_table_columns(md_paths, columns=("Language", "Country", "Owner Type")):
+    """
+    collect columns of the enriched ranking tables in README.md / Top100/*.md
+    """
+    from readme_doc import iter_tables
+
+    out = {col: [] for col in columns}
+    for path in md_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            tables = iter_tables(f.read())
+        for table in tables:
+            values = [table.column(col) for col in columns]
+            if any(v is None for v in values):
+                continue
+            for col, v in zip(columns, values):
+                out[col].extend(v)
+    return {col: np.asarray(v, dtype=object) for col, v in out.items()}
+
+
+def log_bins(values, n_bins=40):
+    # logarithmic bin edges covering all positive values
+    values = values[values > 0]
+    if values.size == 0:
+        return np.array([1.0, 10.0])
+    lo, hi = np.log10(values.min()), np.log10(values.max())
+    if hi <= lo:
+        hi = lo + 1
+    return np.logspace(lo, hi, n_bins + 1)
+
+
+def group_small(labels, sizes, threshold=0.03, other="Other"):
+    """
+    sort slices by size and fold every slice under threshold * total into `other`
+    """
+    labels = np.asarray(labels, dtype=object)
+    sizes = np.asarray(sizes, dtype=float)
+    order = np.argsort(-sizes, kind="stable")
+    labels, sizes = labels[order], sizes[order]
+    keep = sizes > sizes.sum() * threshold
+    if keep.all():
+        return labels, sizes
+    return (
+        np.append(labels[keep], other),
+        np.append(sizes[keep], sizes[~keep].sum()),
+    )
+
+
+def decimate(x, y, max_points=20000, grid=300):
+    """
+    thin a log-log scatter to at most max_points: keep one point per occupied
+    grid cell, then stride what is left. Dense regions lose points, outliers stay
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = (x > 0) & (y > 0)
+    x, y = x[mask], y[mask]
+    if x.size <= max_points:
+        return x, y
+    lx, ly = np.log10(x), np.log10(y)
+    cx = ((lx - lx.min()) / (np.ptp(lx) or 1) * (grid - 1)).astype(np.int64)
+    cy = ((ly - ly.min()) / (np.ptp(ly) or 1) * (grid - 1)).astype(np.int64)
+    _, first = np.unique(cx * grid + cy, return_index=True)
+    if first.size > max_points:
+        first = first[:: int(np.ceil(first.size / max_points))]
+    return x[first], y[first]
+
+
+def _pyplot():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _save(fig, output_base, formats):
+    plt = _pyplot()
+    paths = []
+    for fmt in formats:
+        path = f"{output_base}.{fmt}"
+        fig.savefig(path, bbox_inches="tight")
+        paths.append(path)
+    plt.close(fig)
+    print(f"Chart saved to {', '.join(paths)}")
+    return paths
+
+
+def plot_distributions(stars, forks, output_base, formats=DEFAULT_FORMATS, n_bins=40):
+    """
+    star and fork count histograms on log bins
+    """
+    plt = _pyplot()
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4.5))
+    for ax, values, name in ((axes[0], stars, "Stars"), (axes[1], forks, "Forks")):
+        values = np.asarray(values, dtype=float)
+        edges = log_bins(values, n_bins)
+        counts, _ = np.histogram(values, bins=edges)
+        # histogram already computed, matplotlib only draws the bars
+        ax.hist(edges[:-1], bins=edges, weights=counts)
+        ax.set_xscale("log")
+        ax.set_xlabel(name)
+        ax.set_ylabel("Repositories")
+        ax.set_title(f"{name} distribution")
+    return _save(fig, output_base, formats)
+
+
+def plot_stars_vs_forks(stars, forks, output_base, formats=DEFAULT_FORMATS, max_points=20000):
+    plt = _pyplot()
+    x, y = decimate(stars, forks, max_points=max_points)
+    fig, ax = plt.subplots(figsize=(7, 6))
+    ax.scatter(x, y, s=4, alpha=0.5, linewidths=0, rasterized=True)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Stars")
+    ax.set_ylabel("Forks")
+    ax.set_title(f"Stars vs forks ({x.size} of {np.size(stars)} repos shown)")
+    return _save(fig, output_base, formats)
+
+
+def language_share(history, top_k=10):
+    """
+    share of each language per snapshot date, languages outside the overall
+    top_k are summed into Other. returns (dates, languages, shares[date, lang])
+    """
+    import pandas as pd
+
+    language = history["language"].fillna("None")
+    table = pd.crosstab(history["date"], language, normalize="index")
+    top = table.sum().sort_values(ascending=False).index[:top_k]
+    shares = table[top]
+    rest = table.drop(columns=top).sum(axis=1)
+    if (rest > 0).any():
+        shares = shares.assign(Other=rest)
+    return shares.index.to_numpy(), shares.columns.to_numpy(), shares.to_numpy()
+
+
+def plot_language_share(history, output_base, formats=DEFAULT_FORMATS, top_k=10):
+    plt = _pyplot()
+    dates, langs, shares = language_share(history, top_k=top_k)
+    fig, ax = plt.subplots(figsize=(12, 5))
+    x = np.arange(dates.size)
+    ax.stackplot(x, shares.T * 100, labels=langs)
+    step = max(1, dates.size // 12)
+    ax.set_xticks(x[::step])
+    ax.set_xticklabels(dates[::step], rotation=45, ha="right")
+    ax.set_ylabel("Share of top repositories (%)")
+    ax.set_ylim(0, 100)
+    ax.set_title("Language share over time")
+    ax.legend(loc="center left", bbox_to_anchor=(1, 0.5))
+    return _save(fig, output_base, formats)
+
+
+def country_by_language(language, country, top_languages=10, top_countries=8):
+    """
+    count matrix [language, country] of the most common languages and countries
+    """
+    language = np.asarray(language, dtype=object)
+    country = np.asarray(country, dtype=object)
+    lang_labels, lang_idx = np.unique(language, return_inverse=True)
+    country_labels, country_idx = np.unique(country, return_inverse=True)
+    counts = np.zeros((lang_labels.size, country_labels.size), dtype=np.int64)
+    np.add.at(counts, (lang_idx, country_idx), 1)
+
+    lang_order = np.argsort(-counts.sum(axis=1), kind="stable")[:top_languages]
+    country_order = np.argsort(-counts.sum(axis=0), kind="stable")
+    main, rest = country_order[:top_countries], country_order[top_countries:]
+    matrix = counts[np.ix_(lang_order, main)]
+    labels = country_labels[main]
+    if rest.size:
+        matrix = np.column_stack([matrix, counts[np.ix_(lang_order, rest)].sum(axis=1)])
+        labels = np.append(labels, "Other")
+    return lang_labels[lang_order], labels, matrix
+
+
+def plot_country_by_language(language, country, output_base, formats=DEFAULT_FORMATS):
+    plt = _pyplot()
+    langs, countries, matrix = country_by_language(language, country)
+    fig, ax = plt.subplots(figsize=(10, max(3, 0.5 * langs.size + 1)))
+    left = np.zeros(langs.size)
+    for j, name in enumerate(countries):
+        ax.barh(langs, matrix[:, j], left=left, label=name)
+        left += matrix[:, j]
+    ax.invert_yaxis()
+    ax.set_xlabel("Repositories")
+    ax.set_title("Owner country per language")
+    ax.legend(loc="center left", bbox_to_anchor=(1, 0.5))
+    return _save(fig, output_base, formats)
+
+
+def render_all(data_dir="../Data", md_paths=(), out_dir="../Charts", formats=DEFAULT_FORMATS):
+    """
+    render every chart the available data allows, returns the written paths
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    snapshots = list_snapshots(data_dir)
+    if snapshots:
+        latest = load_snapshot(snapshots[-1][1])
+        # the same repo appears in several lists, count it once
+        _, first = np.unique(latest["repo_url"].astype(str), return_index=True)
+        stars, forks = latest["stars"][first], latest["forks"][first]
+        paths += plot_distributions(stars, forks, os.path.join(out_dir, "distribution"), formats)
+        paths += plot_stars_vs_forks(stars, forks, os.path.join(out_dir, "stars_vs_forks"), formats)
+        history = load_history(snapshots)
+        paths += plot_language_share(history, os.path.join(out_dir, "language_share"), formats)
+    else:
+        print(f"No snapshots in {data_dir}, skipping distribution and history charts.")
+
+    tables = load_table_columns(md_paths, columns=("Language", "Country"))
+    if tables["Country"].size:
+        paths += plot_country_by_language(
+            tables["Language"], tables["Country"], os.path.join(out_dir, "country_by_language"), formats
+        )
+    else:
+        print("No enriched tables with a Country column, skipping country chart.")
+    return paths
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+single entry point for the ranking pipeline
+
+    python cli.py fetch  [--spill-dir DIR]   crawl GitHub into a spill dir
+                         [--cache-dir DIR] [--cache-ttl SEC] [--offline] [--planner]
+                         [--profile minimal|standard|full] [--list-profile ITEM=PROFILE]
+                         [--activity] [--tiered | --superset [--approximate]]
+    python cli.py render [--spill-dir DIR]   write README.md and Top100/*.md
+    python cli.py csv    [--spill-dir DIR]   export Data/github-ranking-*.csv
+    python cli.py enrich [--readme FILE]     add owner type / country columns
+    python cli.py chart  [--readme FILE]     draw the country chart
+                         [--data-dir DIR]    plus distribution, scatter, history charts
+    python cli.py aggregate [--tables FILE...]  country x language x owner type report
+    python cli.py serve  [--port N]          local JSON query server with hot reload
+    python cli.py search QUERY...            prefix full-text search, star boosted
+    python cli.py daemon [--every ITEM=SEC]  resident refresh loop with warm caches
+    python cli.py queue enqueue|work|merge|retry|status  sharded crawl over a shared work queue
+    python cli.py anomalies [--annotate FILE...]  star spike report over Data/*.csv
+    python cli.py discover [--max-requests N]  New & Rising section from created: windows
+
+heavy dependencies (requests, pandas, matplotlib) are imported inside the
+subcommand that needs them, never at module level
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from common import README_PATH
+
+DEFAULT_SPILL_DIR = "../Spill"
+
+
+def cmd_fetch(args):
+    from gql_cache import configure_cache
+    from process import ProcessorGQL
+
+    configure_cache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline or None)
+
+    activity = None
+    if args.activity:
+        from activity import ActivityFetcher
+
+        activity = ActivityFetcher()
+    planner = None
+    if args.planner:
+        from planner import QueryPlanner
+
+        planner = QueryPlanner()
+    policy = None
+    if args.tiered:
+        from refresh_policy import RefreshPolicy
+
+        policy = RefreshPolicy(data_dir=args.data_dir)
+    processor = ProcessorGQL(
+        spill_dir=args.spill_dir,
+        planner=planner,
+        profile=args.profile,
+        list_profiles=dict(args.list_profile),
+        activity=activity,
+        refresh_policy=policy,
+    )
+    if args.superset:
+        from superset import SupersetRanker
+
+        ranker = SupersetRanker(processor, pages=args.superset_pages, fallback=not args.approximate)
+        ranker.get_all_repos()
+        ranker.save_notes(args.spill_dir)
+    else:
+        processor.get_all_repos()
+        # extra lists of an earlier superset crawl are stale now
+        if os.path.exists(os.path.join(args.spill_dir, "superset.json")):
+            os.remove(os.path.join(args.spill_dir, "superset.json"))
+    print(f"Saved fetched lists to {args.spill_dir}")
+
+
+def cmd_render(args):
+    from process import WriteFile, load_spilled_extras, load_spilled_notes, load_spilled_repos
+
+    wt_obj = WriteFile(
+        *load_spilled_repos(args.spill_dir),
+        extra_lists=load_spilled_extras(args.spill_dir),
+        notes=load_spilled_notes(args.spill_dir),
+    )
+    wt_obj.write_head_contents()
+    wt_obj.write_readme_lang_md()
+
+
+def cmd_csv(args):
+    from process import WriteFile, load_spilled_extras, load_spilled_notes, load_spilled_repos
+
+    wt_obj = WriteFile(
+        *load_spilled_repos(args.spill_dir),
+        extra_lists=load_spilled_extras(args.spill_dir),
+        notes=load_spilled_notes(args.spill_dir),
+    )
+    wt_obj.save_to_csv()
+
+
+def cmd_enrich(args):
+    import update_readme_mycopy
+
+    update_readme_mycopy.README_FILE = args.readme
+    update_readme_mycopy.main()
+
+
+def cmd_chart(args):
+    import generate_charts
+
+    generate_charts.main(readme_path=args.readme, chart_image_name=args.output)
+    if args.data_dir:
+        import chart_engine
+
+        chart_engine.render_all(
+            data_dir=args.data_dir,
+            md_paths=[args.readme, *args.tables],
+            out_dir=args.out_dir,
+            formats=args.format,
+        )
+
+
+def cmd_aggregate(args):
+    import aggregate
+
+    if args.spill_dir:
+        from process import WriteFile, load_spilled_repos
+
+        frame = aggregate.frame_from_repo_list(
+            WriteFile(*load_spilled_repos(args.spill_dir)).repo_list
+        )
+    else:
+        from snapshots import list_snapshots
+
+        snapshots = list_snapshots(args.data_dir)
+        if not snapshots:
+            print(f"No snapshots in {args.data_dir}.")
+            return
+        frame = aggregate.frame_from_snapshot(snapshots[-1][1])
+    owners = aggregate.load_owner_map(args.tables)
+    cube = aggregate.build_cube(frame, owners)
+    repo_cube = aggregate.build_repo_cube(frame, owners)
+    aggregate.write_report(cube, repo_cube, out_dir=args.out_dir, top=args.top)
+
+
+def cmd_serve(args):
+    import serve
+
+    owners = None
+    if args.tables:
+        from aggregate import load_owner_map
+
+        owners = load_owner_map(args.tables)
+    holder = serve.IndexHolder(
+        data_dir=args.data_dir, spill_dir=args.spill_dir, owners=owners, poll=args.poll
+    )
+    serve.serve(holder, host=args.host, port=args.port)
+
+
+def cmd_search(args):
+    from search_index import SearchIndex
+
+    index = SearchIndex.load(args.index_file)
+    if index.update(args.data_dir):
+        index.save(args.index_file)
+    for hit in index.search(" ".join(args.query), n=args.n, language=args.language):
+        print(f"{hit['stars']:>8}  {hit['key']:<45} {hit['description'] or ''}")
+
+
+def cmd_daemon(args):
+    from daemon import RefreshDaemon, parse_intervals
+    from gql_cache import configure_cache
+    from process import ProcessorGQL
+
+    intervals = parse_intervals(args.every)
+    policy = None
+    if args.tiered:
+        from refresh_policy import DAY, RefreshPolicy
+
+        policy = RefreshPolicy(data_dir=args.data_dir)
+    # a cached page must expire before the next refresh of any list, else
+    # the refresh gets the old page back; half the shortest interval leaves
+    # room for a cache entry written a little after the round started
+    shortest = min([DAY if policy is not None else args.interval, *intervals.values()])
+    configure_cache(args.cache_dir, ttl=shortest / 2)
+    processor = ProcessorGQL(spill_dir=args.spill_dir)
+    daemon = RefreshDaemon(
+        processor,
+        intervals=intervals,
+        default_interval=args.interval,
+        enrich=args.enrich,
+        policy=policy,
+    )
+    daemon.warm_start(args.data_dir)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        print("Daemon stopped.")
+
+
+def cmd_queue(args):
+    import workqueue
+    from gql_cache import configure_cache
+    from process import ProcessorGQL
+
+    queue = workqueue.WorkQueue(args.queue_dir)
+    crawl = args.crawl or workqueue.default_crawl_id()
+    processor = ProcessorGQL()
+    if args.action == "enqueue":
+        added = queue.enqueue(crawl, processor.list_specs(), bounds=args.star_bounds)
+        print(f"Enqueued {added} work items for crawl {crawl}")
+    elif args.action == "work":
+        configure_cache(args.cache_dir)
+        workqueue.run_worker(queue, crawl, processor, worker=args.worker)
+    elif args.action == "merge":
+        count = processor.bulk_size * processor.bulk_count
+        if not workqueue.merge(queue, crawl, args.spill_dir, count):
+            return 1
+    elif args.action == "retry":
+        print(f"Requeued {queue.retry(crawl)} failed work items for crawl {crawl}")
+    print(f"Crawl {crawl}: {queue.status(crawl)}")
+
+
+def cmd_anomalies(args):
+    import anomaly
+    from snapshots import list_snapshots
+
+    snapshots = list_snapshots(args.data_dir)
+    if len(snapshots) < 3:
+        print(f"Need at least 3 snapshots in {args.data_dir}, found {len(snapshots)}.")
+        return
+    matrix = anomaly.load_star_matrix(snapshots)
+    spikes = anomaly.detect_spikes(
+        matrix, window=args.window, threshold=args.threshold, min_delta=args.min_delta
+    )
+    anomaly.write_report(spikes, out_dir=args.data_dir)
+    if args.annotate:
+        # only spikes on the latest snapshot date mark the current tables
+        latest = spikes[spikes["date"] == matrix.index[-1].strftime("%Y-%m-%d")]
+        flagged = set(latest["repo_url"])
+        for path in args.annotate:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(anomaly.annotate_tables(content, flagged))
+        print(f"Flagged {len(flagged)} repos in {', '.join(args.annotate)}")
+
+
+def cmd_discover(args):
+    import discovery
+    from gql_cache import configure_cache
+
+    configure_cache(args.cache_dir)
+    sweep = discovery.DiscoverySweep(
+        min_stars=args.min_stars, max_workers=args.workers, max_requests=args.max_requests
+    )
+    discovery.update_readme(args.readme, sweep.sweep(), top=args.top)
+
+
+def list_profile(pair):
+    # "ITEM=PROFILE" -> (item, profile), checked before any list is fetched
+    from process import FIELD_PROFILES
+
+    item, _, profile = pair.partition("=")
+    if profile not in FIELD_PROFILES:
+        raise argparse.ArgumentTypeError(
+            f"expected ITEM=PROFILE with PROFILE one of {', '.join(FIELD_PROFILES)}, got {pair!r}"
+        )
+    return item, profile
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Tops-of-Github ranking pipeline")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+
+    for name, func, help_text in (
+        ("fetch", cmd_fetch, "fetch all ranking lists from the GraphQL API"),
+        ("render", cmd_render, "render README.md and Top100 files"),
+        ("csv", cmd_csv, "export the fetched lists to Data/*.csv"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--spill-dir", default=DEFAULT_SPILL_DIR)
+        p.set_defaults(func=func)
+    p = sub.choices["fetch"]
+    p.add_argument("--cache-dir", help="cache GraphQL responses here (GQL_CACHE_DIR)")
+    p.add_argument("--cache-ttl", type=float, help="cache lifetime in seconds (GQL_CACHE_TTL)")
+    p.add_argument(
+        "--offline", action="store_true", help="serve from the cache only, never call the API"
+    )
+    p.add_argument(
+        "--planner", action="store_true", help="route lists to the GraphQL or REST bucket by quota"
+    )
+    p.add_argument(
+        "--profile", choices=["minimal", "standard", "full"], default="full", help="GraphQL fields to fetch"
+    )
+    p.add_argument(
+        "--list-profile",
+        nargs="*",
+        type=list_profile,
+        default=[],
+        metavar="ITEM=PROFILE",
+        help="per-list field profile",
+    )
+    p.add_argument(
+        "--activity", action="store_true", help="add commits (30d), latest release, mentionable users"
+    )
+    # superset mode derives lists instead of fetching them, so no list has a tier
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--tiered", action="store_true", help="refetch busy lists daily, stable ones weekly"
+    )
+    p.add_argument("--data-dir", default="../Data", help="snapshots that unrefreshed lists come from")
+    mode.add_argument(
+        "--superset",
+        action="store_true",
+        help="derive stars, forks, open issues, recently active from one deep fetch",
+    )
+    p.add_argument(
+        "--superset-pages",
+        type=int,
+        default=None,
+        help="superset pages of 50 repos, default: a few times what one list needs",
+    )
+    p.add_argument(
+        "--approximate",
+        action="store_true",
+        help="keep lists that fail the exactness check instead of fetching them",
+    )
+
+    p = sub.add_parser("enrich", help="add owner type and country to the README table")
+    p.add_argument("--readme", default=README_PATH)
+    p.set_defaults(func=cmd_enrich)
+
+    p = sub.add_parser("chart", help="generate the owner country chart")
+    p.add_argument("--readme", default=README_PATH)
+    p.add_argument("--output", default="country_distribution.png", help="image path relative to the README")
+    p.add_argument("--data-dir", help="also render distribution/history charts from Data/*.csv")
+    p.add_argument("--tables", nargs="*", default=[], help="extra enriched tables, e.g. Top100/*.md")
+    p.add_argument("--out-dir", default="../Charts")
+    p.add_argument("--format", nargs="+", default=["png", "svg"])
+    p.set_defaults(func=cmd_chart)
+
+    p = sub.add_parser("aggregate", help="country x language x owner type report")
+    p.add_argument("--spill-dir", help="aggregate a spilled crawl instead of the latest snapshot")
+    p.add_argument("--data-dir", default="../Data")
+    p.add_argument("--tables", nargs="*", default=[README_PATH], help="enriched tables with owner data")
+    p.add_argument("--out-dir", default="../Data/aggregates")
+    p.add_argument("--top", type=int, default=15)
+    p.set_defaults(func=cmd_aggregate)
+
+    p = sub.add_parser("serve", help="local JSON query server over the latest snapshot")
+    p.add_argument("--data-dir", default="../Data")
+    p.add_argument("--spill-dir", help="serve a spill dir instead of the latest snapshot")
+    p.add_argument("--tables", nargs="*", default=[], help="enriched tables for country filters")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--poll", type=float, default=5.0, help="seconds between reload checks")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("search", help="full-text search over repo names and descriptions")
+    p.add_argument("query", nargs="+")
+    p.add_argument("--data-dir", default="../Data")
+    p.add_argument("--index-file", default="../Data/search-index.json.gz")
+    p.add_argument("--language")
+    p.add_argument("-n", type=int, default=20)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("daemon", help="stay resident and refresh lists on their own schedule")
+    p.add_argument("--spill-dir", default=DEFAULT_SPILL_DIR)
+    p.add_argument("--data-dir", default="../Data")
+    p.add_argument("--cache-dir", help="GraphQL response cache (GQL_CACHE_DIR)")
+    p.add_argument("--interval", type=float, default=3600, help="default seconds between refreshes")
+    p.add_argument(
+        "--every", nargs="*", default=[], metavar="ITEM=SECONDS", help="per-list intervals"
+    )
+    p.add_argument("--enrich", action="store_true", help="also refresh Owner Type / Country")
+    p.add_argument(
+        "--tiered", action="store_true", help="interval per list from its churn (daily or weekly)"
+    )
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("queue", help="sharded crawl through a shared SQLite work queue")
+    p.add_argument("action", choices=["enqueue", "work", "merge", "retry", "status"])
+    p.add_argument("--queue-dir", default="../Queue", help="shared by every worker")
+    p.add_argument("--crawl", help="crawl id, defaults to today's date")
+    p.add_argument(
+        "--star-bounds", nargs="*", type=int, help="split each list into metric ranges at these values"
+    )
+    p.add_argument("--worker", help="worker id, defaults to host-pid")
+    p.add_argument("--cache-dir", help="GraphQL response cache (GQL_CACHE_DIR)")
+    p.add_argument("--spill-dir", default=DEFAULT_SPILL_DIR, help="merge output, read by render/csv")
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("anomalies", help="flag star spikes over the snapshot history")
+    p.add_argument("--data-dir", default="../Data")
+    p.add_argument("--window", type=int, default=28, help="baseline snapshots per repo")
+    p.add_argument("--threshold", type=float, default=6.0, help="robust z-score to flag")
+    p.add_argument("--min-delta", type=float, default=50, help="ignore spikes under this many stars/day")
+    p.add_argument("--annotate", nargs="*", default=[], help=f"tables to mark, e.g. {README_PATH}")
+    p.set_defaults(func=cmd_anomalies)
+
+    p = sub.add_parser("discover", help="sweep recently created repos into a New & Rising section")
+    p.add_argument("--readme", default=README_PATH)
+    p.add_argument("--cache-dir", help="GraphQL response cache (GQL_CACHE_DIR)")
+    p.add_argument("--min-stars", type=int, default=10)
+    p.add_argument("--workers", type=int, default=4, help="concurrent search requests")
+    p.add_argument("--max-requests", type=int, default=200, help="GraphQL requests per sweep")
+    p.add_argument("--top", type=int, default=10, help="rows per window in the README")
+    p.set_defaults(func=cmd_discover)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    t1 = datetime.now()
+    status = args.func(args)
+    print("Total time: {}s".format((datetime.now() - t1).total_seconds()))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,25 @@
 # -*- coding: utf-8 -*-
 import json
-import requests
 import time
+from gql_cache import get_cache
+
+# README that WriteFile renders, relative to the source dir like ../Data
+README_PATH = "../README.md"
+
+_session = None
+
+
+def get_session():
+    """
+    one pooled requests session per process, so a long running process
+    reuses its TLS connections to api.github.com instead of reconnecting
+    """
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+    return _session
 
 
 def get_access_token():
@@ -19,31 +37,55 @@ def write_text(file_name, method, text):
         f.write(text)
 
 
+# (header, record key) of the ranking table columns, a column whose key is
+# missing from the records (not in the fetched field profile) is left out
+RANKING_TABLE_COLUMNS = [
+    ("Ranking", None),
+    ("Project Name", None),
+    ("Stars", "stargazers_count"),
+    ("Forks", "forks_count"),
+    ("Language", "language"),
+    ("Open Issues", "open_issues_count"),
+    ("Description", "description"),
+    ("Last Commit", "pushed_at"),
+    # optional activity columns, see activity.py
+    ("Commits (30d)", "commits_30d"),
+    ("Latest Release", "latest_release"),
+    ("Mentionable Users", "mentionable_users"),
+]
+
+
+def ranking_columns(repos):
+    # columns backed by the first record, every record of a list has the same fields
+    for repo in repos:
+        return [(head, key) for head, key in RANKING_TABLE_COLUMNS if key is None or key in repo]
+    # an empty list shows the base columns, up to Last Commit
+    base = [key for _, key in RANKING_TABLE_COLUMNS].index("pushed_at") + 1
+    return RANKING_TABLE_COLUMNS[:base]
+
+
 def write_ranking_repo(file_name, method, repos):
     # method: 'a'-append or 'w'-overwrite
-    table_head = "| Ranking | Project Name | Stars | Forks | Language | Open Issues | Description | Last Commit |\n\
-| ------- | ------------ | ----- | ----- | -------- | ----------- | ----------- | ----------- |\n"
+    columns = ranking_columns(repos)
+    table_head = "| {} |\n| {} |\n".format(
+        " | ".join(head for head, _ in columns),
+        " | ".join("-" * len(head) for head, _ in columns),
+    )
     with open(file_name, method, encoding="utf-8") as f:
         f.write(table_head)
         for idx, repo in enumerate(repos):
-            repo_description = repo["description"]
-            if repo_description is not None:
-                repo_description = repo_description.replace(
-                    "|", "\|"
-                )  # in case there is '|' in description
-            f.write(
-                "| {} | [{}]({}) | {} | {} | {} | {} | {} | {} |\n".format(
-                    idx + 1,
-                    repo["name"],
-                    repo["html_url"],
-                    repo["stargazers_count"],
-                    repo["forks_count"],
-                    repo["language"],
-                    repo["open_issues_count"],
-                    repo_description,
-                    repo["pushed_at"],
-                )
-            )
+            cells = []
+            for head, key in columns:
+                if head == "Ranking":
+                    cells.append(idx + 1)
+                elif head == "Project Name":
+                    cells.append("[{}]({})".format(repo["name"], repo["html_url"]))
+                elif key == "description" and repo[key] is not None:
+                    # in case there is '|' in description
+                    cells.append(repo[key].replace("|", "\\|"))
+                else:
+                    cells.append(repo[key])
+            f.write("| {} |\n".format(" | ".join(str(cell) for cell in cells)))
         f.write("\n")
 
 
@@ -58,11 +100,10 @@ def get_api_repos(API_URL):
         "Accept-Language": "zh-CN,zh;q=0.9",
         "Authorization": "token {}".format(access_token),
     }
-    s = requests.session()
-    s.keep_alive = False  # don't keep the session
+    s = get_session()
     time.sleep(3)  # not get so fast
     # requests.packages.urllib3.disable_warnings() # disable InsecureRequestWarning of verify=False,
-    r = requests.get(API_URL, headers=headers)
+    r = s.get(API_URL, headers=headers, timeout=30)
     if r.status_code != 200:
         raise ValueError("Can not retrieve from {}".format(API_URL))
     repos_dict = json.loads(r.content)
@@ -72,8 +113,14 @@ def get_api_repos(API_URL):
 
 def get_graphql_data(GQL):
     """
-    use graphql to get data
+    use graphql to get data, served from the local cache when one is configured
     """
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(GQL)
+        if cached is not None:
+            return cached
+
     access_token = get_access_token()
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.113 Safari/537.36",
@@ -81,14 +128,13 @@ def get_graphql_data(GQL):
         "Accept-Language": "zh-CN,zh;q=0.9",
         "Authorization": "bearer {}".format(access_token),
     }
-    s = requests.session()
-    s.keep_alive = False  # don't keep the session
+    s = get_session()
     graphql_api = "https://api.github.com/graphql"
     for _ in range(5):
         time.sleep(2)  # not get so fast
         try:
             # requests.packages.urllib3.disable_warnings() # disable InsecureRequestWarning of verify=False,
-            r = requests.post(
+            r = s.post(
                 url=graphql_api, json={"query": GQL}, headers=headers, timeout=30
             )
             if r.status_code != 200:
@@ -96,7 +142,30 @@ def get_graphql_data(GQL):
                     f"Can not retrieve from {GQL}. Response status is {r.status_code}, content is {r.content}."
                 )
             else:
-                return r.json()
+                result = r.json()
+                if cache is not None and "errors" not in result:
+                    cache.put(GQL, result)
+                return result
         except Exception as e:
             print(e)
             time.sleep(5)
+
+
+COUNT_GQL = """query{
+    search(query: "%s", type: REPOSITORY, first: 0) {
+        repositoryCount
+    }
+}"""
+
+
+def get_repository_count(search):
+    """
+    number of repositories matching a search, one cheap request without nodes
+    None when the request failed or returned errors only
+    """
+    result = get_graphql_data(COUNT_GQL % search)
+    data = (result or {}).get("data")
+    if not data:
+        print(f"Count of {search!r} failed: {(result or {}).get('errors')}")
+        return None
+    return data["search"]["repositoryCount"]
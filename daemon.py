@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+resident refresh loop, the long running alternative to cron + autorun.sh
+
+the process keeps its pooled HTTP session, OWNER_CACHE, the GraphQL cache
+and the last fetched lists in memory, and only refetches a list when its own
+interval has passed. README / Top100 / CSV are rewritten after every round
+that refreshed at least one list
+"""
+import os
+import time
+from datetime import datetime
+
+DEFAULT_INTERVAL = 3600
+DAY = 24 * 3600
+
+
+class RefreshDaemon(object):
+    def __init__(
+        self, processor, intervals=None, default_interval=DEFAULT_INTERVAL, enrich=False, policy=None
+    ):
+        """
+        processor: ProcessorGQL, intervals: {item: seconds} overriding default_interval
+        policy: RefreshPolicy, its churn tier replaces default_interval per list
+        """
+        self.processor = processor
+        self.intervals = intervals or {}
+        self.default_interval = default_interval
+        self.enrich = enrich
+        self.policy = policy
+        self.lists = {}  # item -> repos of the last fetch, kept warm
+        self.fetched = {}  # item -> unix time the list in self.lists was fetched
+        self.next_due = {}  # item -> unix time of the next refresh
+
+    def list_specs(self):
+        return self.processor.list_specs()
+
+    def interval(self, item):
+        if item in self.intervals:
+            return self.intervals[item]
+        if self.policy is not None:
+            return self.policy.interval(item)
+        return self.default_interval
+
+    def warm_start(self, data_dir="../Data"):
+        """
+        load the previous lists so a restart does not refetch everything:
+        spilled lists are due one interval after their file was written,
+        lists taken from the latest snapshot csv one interval after that file
+        """
+        from snapshots import latest_snapshot, load_snapshot_repos, mark_reused
+
+        if self.policy is not None:
+            self.policy.bootstrap([item for item, _ in self.list_specs()])
+        store = self.processor.store
+        snapshot = latest_snapshot(data_dir)
+        snapshot_lists = load_snapshot_repos(snapshot) if snapshot else {}
+        for item, _ in self.list_specs():
+            if store is not None and store.exists(item):
+                self.lists[item] = store.open(item)
+                written = os.path.getmtime(store.path(item))
+            elif item in snapshot_lists:
+                self.lists[item] = mark_reused(snapshot_lists[item])
+                written = os.path.getmtime(snapshot)
+            else:
+                continue
+            self.fetched[item] = written
+            self.next_due[item] = written + self.interval(item)
+        print(f"Warm start: {len(self.lists)} lists loaded")
+
+    def run_once(self, now=None):
+        """
+        refresh every due list, rewrite the outputs when anything changed
+        returns the refreshed items
+        """
+        now = time.time() if now is None else now
+        refreshed = []
+        for item, search in self.list_specs():
+            if self.next_due.get(item, 0) > now:
+                continue
+            print(f"Refresh {item}...")
+            try:
+                self.lists[item] = self.processor.fetch_list(search, item)
+            except Exception as e:
+                # keep serving the previous list, retry on the next round
+                print(f"Refresh {item} failed: {e}")
+                self.next_due[item] = now + min(self.interval(item), 300)
+                continue
+            self.fetched[item] = now
+            if self.policy is not None:
+                self.policy.record(item, self.lists[item], now)
+            self.next_due[item] = now + self.interval(item)
+            refreshed.append(item)
+        if refreshed:
+            if self.policy is not None:
+                self.policy.save()
+            self.write(now)
+        return refreshed
+
+    def current_lists(self, now=None):
+        """
+        self.lists for the snapshot of now's UTC date, lists fetched before
+        that date marked as reused so their counts stay out of the history
+        """
+        from snapshots import mark_reused
+
+        now = time.time() if now is None else now
+        day_start = now - now % DAY
+        return {
+            item: repos if self.fetched.get(item, 0) >= day_start else mark_reused(repos)
+            for item, repos in self.lists.items()
+        }
+
+    def write(self, now=None):
+        from process import WriteFile, languages
+
+        if "top-100-stars" not in self.lists or "top-100-forks" not in self.lists:
+            return
+        lists = self.current_lists(now)
+        wt_obj = WriteFile(
+            lists["top-100-stars"],
+            lists["top-100-forks"],
+            {lang: lists.get(lang, []) for lang in languages},
+        )
+        wt_obj.write_head_contents()
+        wt_obj.write_readme_lang_md()
+        wt_obj.save_to_csv()
+        if self.enrich:
+            # OWNER_CACHE lives in the module, so owners resolved in earlier
+            # rounds cost nothing here
+            import update_readme_mycopy
+            from common import README_PATH
+
+            with open(README_PATH, "r", encoding="utf-8") as f:
+                content = f.read()
+            with open(README_PATH, "w", encoding="utf-8") as f:
+                f.write(update_readme_mycopy.update_readme_table(content))
+
+    def run_forever(self, max_sleep=600):
+        while True:
+            self.run_once()
+            wake = min(self.next_due.values(), default=time.time() + max_sleep)
+            sleep = min(max(wake - time.time(), 1), max_sleep)
+            print(f"{datetime.utcnow():%Y-%m-%dT%H:%M:%SZ} next refresh in {sleep:.0f}s")
+            time.sleep(sleep)
+
+
+def parse_intervals(pairs):
+    """
+    ["Python=3600", "TeX=604800"] -> {"Python": 3600.0, "TeX": 604800.0}
+    """
+    intervals = {}
+    for pair in pairs or []:
+        item, _, seconds = pair.partition("=")
+        if not seconds:
+            raise ValueError(f"Expected item=seconds, got {pair!r}")
+        intervals[item] = float(seconds)
+    return intervals
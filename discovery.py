@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+discovery sweep for young, fast growing repositories
+
+the ranking searches sort by total stars, so a month old project never
+makes a list. this sweep searches created: windows (last day, last week,
+last month) instead. a window matching more than the 1000 results search
+can reach is split in halves until every piece fits, using cheap count-only
+queries, then the top page of every piece is fetched. all windows of one
+level are queried concurrently, and max_requests bounds the whole sweep
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from common import get_graphql_data, get_repository_count
+from process import FIELD_PROFILES, ProcessorGQL
+
+SEARCH_CAP = 1000  # results a single search can page through
+DISCOVERY_SECTION = "new-and-rising"
+# (label, days back) of each window, windows are disjoint: the week window
+# starts where the day window ends
+WINDOWS = [("day", 1), ("week", 7), ("month", 30)]
+
+PAGE_GQL = """query{
+    search(query: "%s", type: REPOSITORY, first: %d) {
+        repositoryCount
+        edges {
+            node {
+                ...on Repository {%s
+                    createdAt
+                }
+            }
+        }
+    }
+}"""
+
+
+def iso(t):
+    return t.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def window_search(start, end, min_stars):
+    return f"created:{iso(start)}..{iso(end)} stars:>={min_stars} sort:stars"
+
+
+class DiscoverySweep(object):
+    def __init__(
+        self, min_stars=10, page_size=50, max_workers=4, max_requests=200, min_span=timedelta(hours=1)
+    ):
+        self.min_stars = min_stars
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.max_requests = max_requests
+        self.min_span = min_span
+        self.requests = 0
+
+    def count(self, start, end):
+        # None when the request failed, the window is then left out of the sweep
+        return get_repository_count(window_search(start, end, self.min_stars))
+
+    def fetch_page(self, start, end):
+        """
+        top page_size repos of one window, parse_gql_result records plus created_at
+        a failed request gives an empty page instead of aborting the sweep
+        """
+        search = window_search(start, end, self.min_stars)
+        result = get_graphql_data(PAGE_GQL % (search, self.page_size, FIELD_PROFILES["standard"]))
+        if not (result or {}).get("data"):
+            print(f"Window {search!r} failed: {(result or {}).get('errors')}")
+            return []
+        repos = ProcessorGQL.parse_gql_result(result)
+        for repo, edge in zip(repos, result["data"]["search"]["edges"]):
+            repo["created_at"] = edge["node"]["createdAt"]
+        return repos
+
+    def split_windows(self, executor, windows):
+        """
+        split (start, end) windows until each matches at most SEARCH_CAP repos
+        one concurrent round of count queries per level
+        """
+        leaves = []
+        while windows:
+            if self.requests + len(windows) > self.max_requests:
+                # out of budget, fetch the remaining windows unsplit
+                return leaves + windows
+            counts = list(executor.map(lambda w: self.count(*w), windows))
+            self.requests += len(windows)
+            split = []
+            for (start, end), n in zip(windows, counts):
+                if n is None:  # failed, treated as empty like ActivityFetcher does
+                    continue
+                if n <= SEARCH_CAP or end - start <= self.min_span:
+                    if n:
+                        leaves.append((start, end))
+                    continue
+                mid = start + (end - start) / 2
+                split += [(start, mid), (mid, end)]
+            windows = split
+        return leaves
+
+    def sweep(self, now=None):
+        """
+        returns {label: repos} ranked by stars per day of age, where each label
+        covers its own window and every shorter one
+        """
+        now = now or datetime.utcnow().replace(microsecond=0)
+        bounds = []
+        end = now
+        for label, days in WINDOWS:
+            start = now - timedelta(days=days)
+            bounds.append((label, start, end))
+            end = start
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            leaves = self.split_windows(executor, [(start, end) for _, start, end in bounds])
+            # spend what the splitting left, on the newest windows first
+            leaves.sort(key=lambda w: w[1], reverse=True)
+            leaves = leaves[: max(self.max_requests - self.requests, 0)]
+            pages = list(executor.map(lambda w: self.fetch_page(*w), leaves))
+            self.requests += len(leaves)
+        print(f"Discovery sweep: {len(leaves)} windows, {self.requests} requests")
+
+        repos = {}
+        for page in pages:
+            for repo in page:
+                repos[repo["html_url"]] = repo
+        for repo in repos.values():
+            created = datetime.strptime(repo["created_at"], "%Y-%m-%dT%H:%M:%SZ")
+            # at least a day of age, so an hour old repo with 20 stars does not lead
+            age_days = max((now - created).total_seconds() / 86400, 1.0)
+            repo["stars_per_day"] = round(repo["stargazers_count"] / age_days, 1)
+        ranked = sorted(repos.values(), key=lambda r: r["stars_per_day"], reverse=True)
+        return {
+            label: [r for r in ranked if r["created_at"] >= iso(start)]
+            for label, start, _ in bounds
+        }
+
+
+def render_section(rising, top=10):
+    # "Project" rather than "Project Name", so owner enrichment and anomaly
+    # annotation leave this table alone
+    titles = {
+        "day": "Created in the last day",
+        "week": "Created in the last week",
+        "month": "Created in the last month",
+    }
+    body = ["## New & Rising\n\nYoung repositories ranked by stars per day since creation.\n"]
+    for label, _ in WINDOWS:
+        body.append(f"\n### {titles[label]}\n\n")
+        body.append("| Ranking | Project | Stars | Stars/Day | Created | Language | Description |\n")
+        body.append("| ------- | ------- | ----- | --------- | ------- | -------- | ----------- |\n")
+        for idx, repo in enumerate(rising.get(label, [])[:top]):
+            description = (repo.get("description") or "").replace("|", "\\|").replace("\n", " ")
+            body.append(
+                "| {} | [{}]({}) | {} | {} | {} | {} | {} |\n".format(
+                    idx + 1,
+                    repo["name"],
+                    repo["html_url"],
+                    repo["stargazers_count"],
+                    repo["stars_per_day"],
+                    repo["created_at"][:10],
+                    repo.get("language"),
+                    description,
+                )
+            )
+    return "".join(body)
+
+
+def update_readme(readme_path, rising, top=10):
+    from readme_doc import ReadmeDocument
+
+    if not any(rising.values()):
+        # every window failed, keep the section of the last good sweep
+        print(f"Nothing discovered, {readme_path} left as is")
+        return
+    doc = ReadmeDocument.load(readme_path)
+    doc.set_section(DISCOVERY_SECTION, render_section(rising, top), after="top-100-forks")
+    doc.save(readme_path)
+    print(f"Save New & Rising in {readme_path}!")
@@ -1,7 +1,6 @@
-import matplotlib.pyplot as plt
-import pandas as pd
 import re
 import os
+from readme_doc import ReadmeDocument
 
 def extract_country_data(readme_content):
     """
@@ -84,41 +83,17 @@ def generate_pie_chart(country_counts, output_path="country_distribution.png"):
         print("No country data to generate chart.")
         return False
 
-    labels = list(country_counts.keys())
-    sizes = list(country_counts.values())
-
-    # Sort by size for better visualization if many slices
-    sorted_pairs = sorted(zip(sizes, labels), reverse=True)
-    sizes, labels = zip(*sorted_pairs)
-
-    # Combine small slices into 'Other'
-    threshold = sum(sizes) * 0.03 # e.g., 3% of total
-    main_labels = []
-    main_sizes = []
-    other_size = 0
-
-    print(labels)
-    for i in range(len(labels)):
-        if sizes[i] > threshold:
-            main_labels.append(labels[i])
-            main_sizes.append(sizes[i])
-        else:
-            other_size += sizes[i]
-            
-    if other_size > 0:
-        main_labels.append('Other')
-        main_sizes.append(other_size)
-    print(main_labels)
-    print(main_sizes)
-
-    main_labels2 = list(labels)
-    print("main_labels2=>", main_labels2)
-    main_sizes2=[]
-    for i in range(len(labels)):
-        main_sizes2.append(sizes[i])
-    print("main_sizes2=>", main_sizes2)
-    main_labels = main_labels2
-    main_sizes = main_sizes2
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from chart_engine import group_small
+
+    # Sort by size and combine slices under 3% of the total into 'Other'
+    main_labels, main_sizes = group_small(
+        list(country_counts.keys()), list(country_counts.values()), threshold=0.03
+    )
+    print(dict(zip(main_labels, main_sizes)))
 
     fig1, ax1 = plt.subplots(figsize=(10, 10))
     wedges, texts, autotexts = ax1.pie(main_sizes, labels=main_labels, autopct='%1.0f%%', startangle=90,
@@ -136,67 +111,31 @@ def generate_pie_chart(country_counts, output_path="country_distribution.png"):
     print(f"Pie chart saved to {output_path}")
     return True
 
+CHART_SECTION = "country-chart"
+# the unmarked chart block appended by earlier versions of this script
+LEGACY_CHART_RE = re.compile(
+    r"\n*## Repository Owner Country Distribution\n\n!\[Country Distribution\]\(.*?\)\n?"
+)
+
+
 def update_readme_with_chart(readme_path="README.md", chart_image_path="country_distribution.png"):
     """
     Adds or updates the pie chart image reference in README.md.
+    The chart lives in its own marked section, so re-running only replaces that section.
     """
-    with open(readme_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    doc = ReadmeDocument.load(readme_path)
+    chart_markdown = f"## Repository Owner Country Distribution\n\n![Country Distribution]({chart_image_path})\n"
 
-    chart_markdown = f"\n## Repository Owner Country Distribution\n\n![Country Distribution]({chart_image_path})\n"
-    
-    # Find the insertion point: after the "Top 100 Starred repositories" table.
-    # This might be tricky if there are multiple tables or the structure changes.
-    # I'll look for the end of the "Top 100 Starred repositories" data,
-    # and insert the chart markdown before the next '##' header or end of file.
-    
-    # A more robust way: find a specific anchor or section.
-    # For now, let's assume it should go after the last data row of the main table.
-    
-    # Find the main table's start
-    table_start_marker = "## Top 100 Starred repositories"
-    table_start_idx = content.find(table_start_marker)
-
-    if table_start_idx == -1:
-        print(f"Could not find '{table_start_marker}' in README.md. Appending chart to end.")
-        if chart_markdown not in content:
-            content += chart_markdown
-        return content
-
-    # Find the end of the markdown table data
-    # This regex looks for the end of the last table row, followed by an optional empty line
-    # and then either the end of the string or another markdown header.
-    # This is a heuristic and might need tuning.
-    table_end_pattern = re.compile(r"(\|.*\|(?:\n\n|\n(?!\||#))|\Z)", re.DOTALL)
-    
-    # Search from the table_start_idx to ensure we are in the correct table context
-    match = table_end_pattern.search(content, table_start_idx)
-    
-    insert_idx = -1
-    if match:
-        insert_idx = match.end()
+    if not doc.has_section(CHART_SECTION):
+        doc.map_plain_text(lambda text: LEGACY_CHART_RE.sub("\n", text))
+        print("Inserted new chart into README.md")
     else:
-        # Fallback if pattern doesn't match perfectly, append to end of file
-        insert_idx = len(content)
-
-    # Check if the chart markdown is already present and update if necessary
-    existing_chart_pattern = re.compile(r"\n## Repository Owner Country Distribution\n\n!\\[Country Distribution\\]\(.*?\.png\)\\n")
-    existing_chart_match = existing_chart_pattern.search(content, insert_idx - len(chart_markdown) - 100) # Search slightly before expected insertion
-    
-    # if existing_chart_match:
-    # Replace existing chart markdown
-    content = existing_chart_pattern.sub(chart_markdown, content)
-    print("Updated existing chart in README.md")
-    # else:
-    #     # Insert new chart markdown
-    #     content = content[:insert_idx] + chart_markdown + content[insert_idx:]
-    #     print("Inserted new chart into README.md")
-
-    return content
+        print("Updated existing chart in README.md")
+    # right after the stars list when process.py wrote the README, else at the end
+    doc.set_section(CHART_SECTION, chart_markdown, after="top-100-stars")
+    return doc.render()
 
-def main():
-    readme_path = "README.md"
-    chart_image_name = "country_distribution.png"
+def main(readme_path="README.md", chart_image_name="country_distribution.png"):
 
     # Read README.md
     try:
@@ -213,8 +152,8 @@ def main():
         print("No country data extracted. Exiting.")
         return
 
-    # Generate and save pie chart
-    if generate_pie_chart(country_counts, chart_image_name):
+    # Generate and save pie chart next to the README, so the image link resolves from it
+    if generate_pie_chart(country_counts, os.path.join(os.path.dirname(readme_path), chart_image_name)):
         # Update README.md with chart image reference
         updated_readme_content = update_readme_with_chart(readme_path, chart_image_name)
 
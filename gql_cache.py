@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import time
+
+# defaults, overridable by env or configure_cache()
+# GQL_CACHE_DIR enables the cache, GQL_CACHE_TTL is in seconds, GQL_OFFLINE=1 never hits the API
+DEFAULT_TTL = 24 * 3600
+
+
+class CacheMiss(LookupError):
+    """
+    raised in offline mode when a query has never been cached
+    """
+
+
+class GQLCache(object):
+    """
+    content-addressed cache of GraphQL responses
+    the key is the sha256 of the full query text, which already carries the
+    search string and the `after` cursor, so every page is its own entry
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, offline=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(query):
+        # indentation differences in the gql templates must not change the key
+        normalized = " ".join(query.split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, query):
+        """
+        return the cached response, None when missing or older than ttl
+        in offline mode the ttl is ignored and a miss raises CacheMiss
+        """
+        path = self.path(self.key(query))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and (
+            self.offline or time.time() - entry["fetched_at"] <= self.ttl
+        ):
+            return entry["response"]
+        if self.offline:
+            raise CacheMiss(f"Offline mode: no cached response for query {query!r}")
+        return None
+
+    def put(self, query, response):
+        path = self.path(self.key(query))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)  # readers never see a half written entry
+
+
+_cache = None
+_configured = False
+
+
+def configure_cache(cache_dir=None, ttl=None, offline=None):
+    """
+    set up the process wide cache used by common.get_graphql_data
+    arguments left as None fall back to the GQL_CACHE_* / GQL_OFFLINE env vars
+    """
+    global _cache, _configured
+    cache_dir = cache_dir or os.getenv("GQL_CACHE_DIR")
+    if ttl is None:
+        ttl = float(os.getenv("GQL_CACHE_TTL", DEFAULT_TTL))
+    if offline is None:
+        offline = os.getenv("GQL_OFFLINE", "") not in ("", "0", "false")
+    if offline and not cache_dir:
+        raise ValueError("Offline mode needs a cache dir (GQL_CACHE_DIR or --cache-dir)")
+    _cache = GQLCache(cache_dir, ttl=ttl, offline=offline) if cache_dir else None
+    _configured = True
+    return _cache
+
+
+def get_cache():
+    if not _configured:
+        configure_cache()
+    return _cache
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+route each ranking list to the GraphQL or the REST search API
+the two APIs draw on separate rate limit buckets, so when one is drained the
+other can keep the crawl going instead of sleeping until the reset
+"""
+import math
+import time
+from urllib.parse import urlencode
+
+RATE_LIMIT_URL = "https://api.github.com/rate_limit"
+REST_SEARCH_URL = "https://api.github.com/search/repositories"
+
+
+class Bucket(object):
+    """
+    cost model of one API bucket
+    page_size: max results per request, result_cap: search results reachable by paging
+    cost: quota units spent per page, latency: seconds per request incl. our own sleeps
+    """
+
+    def __init__(self, name, page_size, result_cap, cost, latency, limit, window):
+        self.name = name
+        self.page_size = page_size
+        self.result_cap = result_cap
+        self.cost = cost
+        self.latency = latency
+        self.limit = limit
+        self.remaining = limit
+        self.window = window
+        self.reset_at = time.time() + window
+
+    def pages(self, count):
+        return math.ceil(min(count, self.result_cap) / self.page_size)
+
+    def estimate_seconds(self, count, now=None):
+        """
+        time to fetch `count` results, including waiting for the reset when
+        the remaining quota does not cover the pages, drained windows repeat
+        """
+        now = time.time() if now is None else now
+        need = self.pages(count) * self.cost
+        seconds = self.pages(count) * self.latency
+        if self.covers(count):
+            return seconds
+        windows = math.ceil((need - self.remaining) / self.limit)
+        return seconds + max(self.reset_at - now, 0) + (windows - 1) * self.window
+
+    def covers(self, count):
+        # the remaining quota pays for the whole fetch, no wait for the reset
+        return self.pages(count) * self.cost <= self.remaining
+
+    def spend(self, pages=1):
+        self.remaining = max(self.remaining - pages * self.cost, 0)
+
+    def update(self, resource):
+        # resource is one entry of the /rate_limit "resources" dict
+        self.limit = resource["limit"]
+        self.remaining = resource["remaining"]
+        self.reset_at = resource["reset"]
+
+
+def default_buckets():
+    return {
+        # 5000 points per hour, a search page of <=100 nodes costs 1 point,
+        # get_graphql_data sleeps 2s before each request
+        "graphql": Bucket("graphql", 100, 1000, 1, 3.0, 5000, 3600),
+        # search API: 30 requests per minute, 100 per page, get_api_repos sleeps 3s
+        "rest": Bucket("rest", 100, 1000, 1, 4.0, 30, 60),
+    }
+
+
+def get_rate_limits():
+    """
+    current quota of every bucket, the /rate_limit call itself is free
+    """
+    import requests
+
+    from common import get_access_token
+
+    r = requests.get(
+        RATE_LIMIT_URL,
+        headers={"Authorization": "token {}".format(get_access_token())},
+        timeout=30,
+    )
+    if r.status_code != 200:
+        raise ValueError("Can not retrieve from {}".format(RATE_LIMIT_URL))
+    return r.json()["resources"]
+
+
+def split_search(search):
+    """
+    "language:Go stars:>0 sort:stars" -> ("language:Go stars:>0", "stars")
+    the REST API takes the sort as a parameter instead of a qualifier
+    """
+    terms = search.split()
+    sort = None
+    rest = []
+    for term in terms:
+        if term.startswith("sort:"):
+            sort = term[len("sort:") :].split("-")[0]
+        else:
+            rest.append(term)
+    return " ".join(rest), sort
+
+
+def normalize_rest_repo(item):
+    """
+    REST search item -> the record shape of ProcessorGQL.parse_gql_result
+    REST open_issues_count also counts open pull requests, so it is left out
+    like a field outside the profile and the writers drop the Open Issues column
+    """
+    return {
+        "name": item["name"],
+        "stargazers_count": item["stargazers_count"],
+        "forks_count": item["forks_count"],
+        "language": item["language"],
+        "html_url": item["html_url"],
+        "owner": {
+            "login": item["owner"]["login"],
+        },
+        "pushed_at": item["pushed_at"],
+        "description": item["description"],
+    }
+
+
+class QueryPlanner(object):
+    """
+    GraphQL while its remaining quota covers a list fetch, REST records lack
+    open issues; past that the bucket that finishes first, based on its cost
+    model and the remaining quota reported by /rate_limit
+    """
+
+    def __init__(self, buckets=None, refresh_every=1):
+        self.buckets = buckets or default_buckets()
+        self.refresh_every = refresh_every
+        self.plans = 0
+
+    def refresh(self):
+        try:
+            resources = get_rate_limits()
+        except Exception as e:
+            print(f"Can not refresh rate limits, keep local estimates: {e}")
+            return
+        for name, key in (("graphql", "graphql"), ("rest", "search")):
+            if key in resources:
+                self.buckets[name].update(resources[key])
+
+    def choose(self, count):
+        if self.refresh_every and self.plans % self.refresh_every == 0:
+            self.refresh()
+        self.plans += 1
+        now = time.time()
+        if self.buckets["graphql"].covers(count):
+            name = "graphql"
+        else:
+            name = min(self.buckets, key=lambda n: self.buckets[n].estimate_seconds(count, now))
+        bucket = self.buckets[name]
+        print(
+            f"Planner: {bucket.pages(count)} pages via {name} "
+            f"(remaining {bucket.remaining}, ~{bucket.estimate_seconds(count, now):.0f}s)"
+        )
+        return name
+
+    def iter_rest_pages(self, search, count):
+        """
+        yield normalized pages of a REST search, same records as parse_gql_result
+        """
+        from common import get_api_repos
+
+        bucket = self.buckets["rest"]
+        q, sort = split_search(search)
+        per_page = min(bucket.page_size, count)  # constant, page offsets depend on it
+        fetched = 0
+        for page in range(1, bucket.pages(count) + 1):
+            params = {"q": q, "per_page": per_page, "page": page}
+            if sort:
+                params.update(sort=sort, order="desc")
+            items = get_api_repos(REST_SEARCH_URL + "?" + urlencode(params))
+            bucket.spend()
+            yield [normalize_rest_repo(item) for item in items[: count - fetched]]
+            fetched += len(items)
+            if len(items) < per_page:
+                return
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 import os
-import pandas as pd
-from common import get_graphql_data, write_text, write_ranking_repo
+from common import README_PATH, get_graphql_data, write_text, write_ranking_repo
+from readme_doc import wrap_section
+from spill import SpillStore
 import inspect
 import pprint as pp
 # languages = ['Python']  # For test
@@ -119,6 +120,37 @@ table_of_contents = """
 * [Vim script](#vim-script)"""
 
 
+# fields requested per repository node, a smaller profile costs fewer
+# GraphQL points (openIssues is a nested connection) and a smaller payload
+FIELD_PROFILES = {
+    "minimal": """
+                            id
+                            name
+                            url
+                            stargazerCount
+                            owner {
+                                login
+                            }""",
+}
+FIELD_PROFILES["standard"] = (
+    FIELD_PROFILES["minimal"]
+    + """
+                            forkCount
+                            description
+                            pushedAt
+                            primaryLanguage {
+                                name
+                            }"""
+)
+FIELD_PROFILES["full"] = (
+    FIELD_PROFILES["standard"]
+    + """
+                            openIssues: issues(states: OPEN) {
+                                totalCount
+                            }"""
+)
+
+
 class ProcessorGQL(object):
     """
     Github GraphQL API v4
@@ -128,52 +160,54 @@ class ProcessorGQL(object):
     curl -H "Authorization: bearer your-access-token" -X POST -d "{\"query\": \"{ rateLimit { limit cost remaining resetAt used }}\" }" https://api.github.com/graphql
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        spill_dir=None,
+        planner=None,
+        profile="full",
+        list_profiles=None,
+        activity=None,
+        refresh_policy=None,
+    ):
+        # with spill_dir set, every fetched page goes straight to disk and
+        # get_repos returns a SpilledList, so peak memory is one page
+        self.store = SpillStore(spill_dir) if spill_dir else None
         self.gql_format = """query{
     search(query: "%s", type: REPOSITORY, first:%d %s) {
       pageInfo { endCursor }
                 edges {
                     node {
-                        ...on Repository {
-                            id
-                            name
-                            url
-                            forkCount
-                            stargazerCount
-                            owner {
-                                login
-                            }
-                            description
-                            pushedAt
-                            primaryLanguage {
-                                name
-                            }
-                            openIssues: issues(states: OPEN) {
-                                totalCount
-                            }
+                        ...on Repository {%s
                         }
                     }
                 }
             }
         }
         """
+        # field profile per list, lists not in list_profiles use profile
+        self.profile = profile
+        self.list_profiles = list_profiles or {}
         self.bulk_size = 50
         self.bulk_count = 2
-        self.gql_stars = self.gql_format % (
-            "stars:>1000 sort:stars",
-            self.bulk_size,
-            "%s",
-        )
-        self.gql_forks = self.gql_format % (
-            "forks:>1000 sort:forks",
-            self.bulk_size,
-            "%s",
-        )
-        self.gql_stars_lang = self.gql_format % (
-            "language:%s stars:>0 sort:stars",
-            self.bulk_size,
-            "%s",
-        )
+        # search strings of every list, the gql_* templates are built from them
+        self.search_stars = "stars:>1000 sort:stars"
+        self.search_forks = "forks:>1000 sort:forks"
+        self.search_stars_lang = "language:%s stars:>0 sort:stars"
+        self.gql_stars = self.gql_for(self.search_stars)
+        self.gql_forks = self.gql_for(self.search_forks)
+        self.gql_stars_lang = self.gql_for(self.search_stars_lang)
+
+        # optional ActivityFetcher, adds commits / release / contributor columns
+        self.activity = activity
+
+        # optional RefreshPolicy, lists it does not consider due are taken
+        # from the last snapshot instead of fetched
+        self.refresh_policy = refresh_policy
+
+        # optional QueryPlanner, routes each list to the GraphQL or REST bucket
+        self.planner = planner
+        if planner is not None:
+            planner.buckets["graphql"].page_size = self.bulk_size
 
         self.col = [
             "rank",
@@ -191,59 +225,160 @@ class ProcessorGQL(object):
 
     @staticmethod
     def parse_gql_result(result):
+        # fields outside the requested profile are left out of the record,
+        # so writers can tell "not fetched" from an empty value
         res = []
         for repo in result["data"]["search"]["edges"]:
             repo_data = repo["node"]
-            res.append(
-                {
-                    "name": repo_data["name"],
-                    "stargazers_count": repo_data["stargazerCount"],
-                    "forks_count": repo_data["forkCount"],
-                    "language": repo_data["primaryLanguage"]["name"]
+            repo_info = {
+                "name": repo_data["name"],
+                "stargazers_count": repo_data["stargazerCount"],
+                "html_url": repo_data["url"],
+                "owner": {
+                    "login": repo_data["owner"]["login"],
+                },
+            }
+            if "forkCount" in repo_data:
+                repo_info["forks_count"] = repo_data["forkCount"]
+            if "primaryLanguage" in repo_data:
+                repo_info["language"] = (
+                    repo_data["primaryLanguage"]["name"]
                     if repo_data["primaryLanguage"] is not None
-                    else None,
-                    "html_url": repo_data["url"],
-                    "owner": {
-                        "login": repo_data["owner"]["login"],
-                    },
-                    "open_issues_count": repo_data["openIssues"]["totalCount"],
-                    "pushed_at": repo_data["pushedAt"],
-                    "description": repo_data["description"],
-                }
-            )
+                    else None
+                )
+            if "openIssues" in repo_data:
+                repo_info["open_issues_count"] = repo_data["openIssues"]["totalCount"]
+            if "pushedAt" in repo_data:
+                repo_info["pushed_at"] = repo_data["pushedAt"]
+            if "description" in repo_data:
+                repo_info["description"] = repo_data["description"]
+            res.append(repo_info)
         return res
 
-    def get_repos(self, qql):
+    def gql_for(self, search, profile=None):
+        # search string -> query template with a %s placeholder for the cursor
+        fields = FIELD_PROFILES[profile or self.profile]
+        return self.gql_format % (search, self.bulk_size, "%s", fields)
+
+    def iter_gql_pages(self, qql, pages=None):
         cursor = ""
-        repos = []
-        for i in range(0, self.bulk_count):
+        for i in range(0, pages or self.bulk_count):
             repos_gql = get_graphql_data(qql % cursor)
-            cursor = (
-                ', after:"' + repos_gql["data"]["search"]["pageInfo"]["endCursor"] + '"'
-            )
-            repos += self.parse_gql_result(repos_gql)
+            if self.planner is not None:
+                self.planner.buckets["graphql"].spend()
+            yield self.parse_gql_result(repos_gql)
+            end_cursor = repos_gql["data"]["search"]["pageInfo"]["endCursor"]
+            if end_cursor is None:  # fewer results than bulk_size * bulk_count
+                return
+            cursor = ', after:"' + end_cursor + '"'
+
+    def collect(self, pages, item=None):
+        # gather parsed pages into a list, or spill them to disk under item
+        if self.store is None or item is None:
+            repos = []
+            for page in pages:
+                repos += page
+            return repos
+        self.store.reset(item)
+        for page in pages:
+            self.store.append(item, page)
+        self.store.commit(item)
+        return self.store.open(item)
+
+    def get_repos(self, qql, item=None, pages=None):
+        return self.collect(self.iter_gql_pages(qql, pages), item)
+
+    def fetch_list(self, search, item=None):
+        """
+        fetch one ranking list, through the planner's cheapest bucket when set
+        """
+        count = self.bulk_size * self.bulk_count
+        if self.planner is not None and self.planner.choose(count) == "rest":
+            repos = self.collect(self.planner.iter_rest_pages(search, count), item)
+        else:
+            repos = self.get_repos(self.gql_for(search, self.list_profiles.get(item)), item)
+        if self.activity is not None:
+            repos = self.add_activity(repos, item)
+        return repos
+
+    def refresh_list(self, search, item):
+        """
+        fetch_list for lists the refresh policy considers due, the last
+        snapshot's copy of the list otherwise
+        """
+        policy = self.refresh_policy
+        if policy is None:
+            return self.fetch_list(search, item)
+        repos = policy.reuse(item)
+        if repos is not None:
+            print(f"Reuse {item} from {policy.snapshot}")
+            if self.store is not None:
+                self.store.reset(item)
+                self.store.append(item, repos)
+                self.store.commit(item)
+                return self.store.open(item)
+            return repos
+        repos = self.fetch_list(search, item)
+        policy.record(item, repos)
         return repos
 
+    def add_activity(self, repos, item=None):
+        # spilled lists are rewritten batch by batch, never loaded whole;
+        # repos keeps reading the committed file while the new one is written
+        if self.store is None or item is None:
+            return self.activity.enrich(repos)
+        self.store.reset(item)
+        for chunk in repos.chunks(self.activity.batch_size):
+            self.store.append(item, self.activity.enrich(chunk))
+        self.store.commit(item)
+        return self.store.open(item)
+
+    def list_specs(self):
+        # (item, search) of every list WriteFile renders, in get_all_repos order
+        specs = [
+            ("top-100-stars", self.search_stars),
+            ("top-100-forks", self.search_forks),
+        ]
+        specs += [(lang, self.search_stars_lang % lang) for lang in languages]
+        return specs
+
     def get_all_repos(self):
         # get all repos of most stars and forks, and different languages
+        if self.refresh_policy is not None:
+            self.refresh_policy.bootstrap([item for item, _ in self.list_specs()])
         print("Get repos of most stars...")
-        repos_stars = self.get_repos(self.gql_stars)
+        repos_stars = self.refresh_list(self.search_stars, "top-100-stars")
         print("Get repos of most stars success!")
 
         print("Get repos of most forks...")
-        repos_forks = self.get_repos(self.gql_forks)
+        repos_forks = self.refresh_list(self.search_forks, "top-100-forks")
         print("Get repos of most forks success!")
 
         repos_languages = {}
         for lang in languages:
             print("Get most stars repos of {}...".format(lang))
-            repos_languages[lang] = self.get_repos(self.gql_stars_lang % (lang, "%s"))
+            repos_languages[lang] = self.refresh_list(self.search_stars_lang % lang, lang)
             print("Get most stars repos of {} success!".format(lang))
+        if self.refresh_policy is not None:
+            self.refresh_policy.save()
+            print(f"Refresh tiers: {self.refresh_policy.summary()}")
         return repos_stars, repos_forks, repos_languages
 
 
+# rankings only superset mode derives: (item, README title, Top100 title, Top100 file)
+EXTRA_LISTS = [
+    ("top-100-issues", "Most Open Issues", "Top 100 Open Issues", "Top-100-issues.md"),
+    ("recently-active", "Recently Active", "Top 100 Recently Active", "Recently-active.md"),
+]
+
+
 class WriteFile(object):
-    def __init__(self, repos_stars, repos_forks, repos_languages):
+    def __init__(self, repos_stars, repos_forks, repos_languages, extra_lists=None, notes=None):
+        """
+        extra_lists: {item: repos} of EXTRA_LISTS items
+        notes: {item: note} of any list, shown under its heading, e.g. why a
+        ranking is approximate
+        """
         self.repos_stars = repos_stars
         self.repos_forks = repos_forks
         self.repos_languages = repos_languages
@@ -259,7 +394,11 @@ class WriteFile(object):
             "issues",
             "last_commit",
             "description",
+            # False for rows a refresh policy or warm start copied from an
+            # older snapshot, their counts are not from this snapshot's date
+            "refreshed",
         ]
+        self.csv_chunk_size = 1000
         self.repo_list = []
         self.repo_list.extend(
             [
@@ -297,9 +436,25 @@ class WriteFile(object):
                     "item": lang,
                 }
             )
+        for item, title, title_100, file_100 in EXTRA_LISTS:
+            if item not in (extra_lists or {}):
+                continue
+            self.repo_list.append(
+                {
+                    "desc": title,
+                    "desc_md": title,
+                    "title_readme": title,
+                    "title_100": title_100,
+                    "file_100": file_100,
+                    "data": extra_lists[item],
+                    "item": item,
+                }
+            )
+        for repo in self.repo_list:
+            repo["note"] = (notes or {}).get(repo["item"])
+        self.items = [repo["item"] for repo in self.repo_list]
 
-    @staticmethod
-    def write_head_contents():
+    def write_head_contents(self):
         # write the head and contents of README.md
         write_time = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
         head_contents = (
@@ -323,8 +478,14 @@ class WriteFile(object):
             * [Most Forks](#most-forks)""".format(write_time=write_time)
             )
             + table_of_contents
+            # the EXTRA_LISTS this README has, their sections come after the languages
+            + "".join(
+                f"\n* [{title}](#{title.lower().replace(' ', '-')})"
+                for item, title, _, _ in EXTRA_LISTS
+                if item in self.items
+            )
         )
-        write_text("../README.md", "w", head_contents)
+        write_text(README_PATH, "w", head_contents)
 
     def write_readme_lang_md(self):
         os.makedirs("../Top100", exist_ok=True)
@@ -336,65 +497,114 @@ class WriteFile(object):
                 repo["file_100"],
                 repo["data"],
             )
-            write_text(
-                "../README.md",
-                "a",
-                f"\n## {title_readme}\n\nThis is top 10, for more click **[{title_100}](Top100/{file_100})**\n\n",
+            # each list is a marked section, so later stages can patch it in place
+            note = f"*{repo['note']}*\n\n" if repo.get("note") else ""
+            section_head, section_end = wrap_section(
+                repo["item"],
+                f"## {title_readme}\n\n{note}This is top 10, for more click **[{title_100}](Top100/{file_100})**\n\n",
             )
-            write_ranking_repo("../README.md", "a", data[:10])
+            write_text(README_PATH, "a", "\n" + section_head)
+            write_ranking_repo(README_PATH, "a", data[:10])
+            write_text(README_PATH, "a", section_end)
             print(f"Save {title_readme} in README.md!")
 
             # Top 100 file
             write_text(
                 f"../Top100/{file_100}",
                 "w",
-                f"[Github Ranking](../README.md)\n==========\n\n## {title_100}\n\n",
+                f"[Github Ranking](../README.md)\n==========\n\n## {title_100}\n\n{note}",
             )
             write_ranking_repo(f"../Top100/{file_100}", "a", data)
             print(f"Save {title_100} in Top100/{file_100}!\n")
 
-    def repo_to_df(self, repos, item):
-        # prepare for saving data to csv file
+    def repo_to_df(self, repos, item, start=0):
+        # prepare for saving data to csv file, start is the rank offset of a chunk
+        import pandas as pd
+
         repos_list = []
         for idx, repo in enumerate(repos):
             repo_info = [
-                idx + 1,
+                start + idx + 1,
                 item,
                 repo["name"],
                 repo["stargazers_count"],
-                repo["forks_count"],
-                repo["language"],
+                repo.get("forks_count"),
+                repo.get("language"),
                 repo["html_url"],
                 repo["owner"]["login"],
-                repo["open_issues_count"],
-                repo["pushed_at"],
-                repo["description"],
+                repo.get("open_issues_count"),
+                repo.get("pushed_at"),
+                repo.get("description"),
+                repo.get("refreshed", True),
             ]
             repos_list.append(repo_info)
         return pd.DataFrame(repos_list, columns=self.col)
 
     def save_to_csv(self):
         # save top100 repos info to csv file in Data/github-ranking-year-month-day.md
-        df_all = pd.DataFrame(columns=self.col)
-        for repo in self.repo_list:
-            df_repos = self.repo_to_df(repos=repo["data"], item=repo["item"])
-            df_all = df_all.append(df_repos, ignore_index=True)
+        # lists are streamed chunk by chunk, so only csv_chunk_size rows are in memory
+        import pandas as pd
 
         save_date = datetime.utcnow().strftime("%Y-%m-%d")
         os.makedirs("../Data", exist_ok=True)
-        df_all.to_csv(
-            "../Data/github-ranking-" + save_date + ".csv",
-            index=False,
-            encoding="utf-8",
-        )
+        csv_path = "../Data/github-ranking-" + save_date + ".csv"
+        # chunks go to a part file that replaces the snapshot at the end, so
+        # readers watching the snapshot never see it half written
+        part_path = csv_path + ".part"
+        pd.DataFrame(columns=self.col).to_csv(part_path, index=False, encoding="utf-8")
+        for repo in self.repo_list:
+            for start, chunk in iter_chunks(repo["data"], self.csv_chunk_size):
+                df_repos = self.repo_to_df(repos=chunk, item=repo["item"], start=start)
+                df_repos.to_csv(
+                    part_path, mode="a", header=False, index=False, encoding="utf-8"
+                )
+        os.replace(part_path, csv_path)
         print("Save data to Data/github-ranking-" + save_date + ".csv")
 
 
-def run_by_gql():
+def iter_chunks(repos, size):
+    # yield (offset, chunk) over a plain list or a SpilledList
+    if hasattr(repos, "chunks"):
+        start = 0
+        for chunk in repos.chunks(size):
+            yield start, chunk
+            start += len(chunk)
+    else:
+        for start in range(0, len(repos), size):
+            yield start, repos[start : start + size]
+
+
+def load_spilled_repos(spill_dir):
+    # reopen the lists of a previous spilled crawl, in get_all_repos order
+    store = SpillStore(spill_dir)
+    repos_languages = {lang: store.open(lang) for lang in languages}
+    return store.open("top-100-stars"), store.open("top-100-forks"), repos_languages
+
+
+def load_spilled_extras(spill_dir):
+    # {item: repos} of the EXTRA_LISTS a superset crawl spilled, {} after a plain crawl
+    if not os.path.exists(os.path.join(spill_dir, "superset.json")):
+        return {}
+    store = SpillStore(spill_dir)
+    return {item: store.open(item) for item, _, _, _ in EXTRA_LISTS if store.exists(item)}
+
+
+def load_spilled_notes(spill_dir):
+    # {item: note} of the approximate lists of a superset crawl, from its superset.json
+    import json
+
+    notes_path = os.path.join(spill_dir, "superset.json")
+    if not os.path.exists(notes_path):
+        return {}
+    with open(notes_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_by_gql(spill_dir=None):
     ROOT_PATH = os.path.abspath(os.path.join(__file__, "../../"))
     # os.chdir(os.path.join(ROOT_PATH, "source"))
 
-    processor = ProcessorGQL()  # use Github GraphQL API v4
+    processor = ProcessorGQL(spill_dir=spill_dir)  # use Github GraphQL API v4
     repos_stars, repos_forks, repos_languages = processor.get_all_repos()
     print("repos_stars:")
     pp.pprint(repos_stars)
@@ -406,5 +616,5 @@ def run_by_gql():
 
 if __name__ == "__main__":
     t1 = datetime.now()
-    run_by_gql()
+    run_by_gql(spill_dir=os.getenv("SPILL_DIR"))
     print("Total time: {}s".format((datetime.now() - t1).total_seconds()))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import re
+
+SECTION_START = "<!-- section:{} -->"
+SECTION_END = "<!-- /section:{} -->"
+SECTION_RE = re.compile(
+    r"<!-- section:(?P<name>[\w.+-]+) -->\n?(?P<body>.*?)<!-- /section:(?P=name) -->\n?",
+    re.DOTALL,
+)
+CELL_SPLIT_RE = re.compile(r"(?<!\\)\|")
+
+# column order of a ranking table, write_ranking_repo writes the first eight,
+# enrichment and anomaly annotation add the rest. aliases are older header spellings of the same column
+RANKING_COLUMNS = [
+    "Ranking",
+    "Project Name",
+    "Stars",
+    "Forks",
+    "Language",
+    "Open Issues",
+    "Description",
+    "Last Commit",
+    "Owner Type",
+    "Country",
+    "Flags",
+]
+COLUMN_ALIASES = {"Rank": "Ranking"}
+
+
+class ReadmeDocument(object):
+    """
+    markdown file split into plain text and named sections
+    a section is everything between <!-- section:name --> and <!-- /section:name -->,
+    it is parsed once, so patching a section only touches that section's text
+    """
+
+    def __init__(self, text):
+        self.parts = []  # plain strings and [name, body] pairs, in file order
+        self.index = {}  # section name -> position in parts
+        pos = 0
+        for m in SECTION_RE.finditer(text):
+            if m.start() > pos:
+                self.parts.append(text[pos : m.start()])
+            self.index[m.group("name")] = len(self.parts)
+            self.parts.append([m.group("name"), m.group("body")])
+            pos = m.end()
+        if pos < len(text):
+            self.parts.append(text[pos:])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read())
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+
+    def sections(self):
+        return [self.parts[i][0] for i in sorted(self.index.values())]
+
+    def has_section(self, name):
+        return name in self.index
+
+    def get_section(self, name):
+        if name not in self.index:
+            return None
+        return self.parts[self.index[name]][1]
+
+    def set_section(self, name, body, after=None):
+        """
+        replace the body of a section, a missing section is inserted right after
+        section `after` when given and present, otherwise appended to the end
+        """
+        if not body.endswith("\n"):
+            body += "\n"
+        if name in self.index:
+            self.parts[self.index[name]][1] = body
+            return
+        if after in self.index:
+            pos = self.index[after] + 1
+        else:
+            pos = len(self.parts)
+            if self.parts and isinstance(self.parts[-1], str):
+                # keep a blank line between the old last block and the new section
+                self.parts[-1] = self.parts[-1].rstrip("\n") + "\n\n"
+        self.parts.insert(pos, [name, body])
+        self.index = {
+            part[0]: i for i, part in enumerate(self.parts) if isinstance(part, list)
+        }
+
+    def patch_section(self, name, func):
+        # apply func(body) -> body to one section only
+        body = self.get_section(name)
+        if body is not None:
+            self.set_section(name, func(body))
+
+    def map_plain_text(self, func):
+        # apply func(text) -> text to the text outside any section
+        for i, part in enumerate(self.parts):
+            if isinstance(part, str):
+                self.parts[i] = func(part)
+
+    def render(self):
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                out.append(SECTION_START.format(part[0]) + "\n")
+                out.append(part[1])
+                out.append(SECTION_END.format(part[0]) + "\n")
+        return "".join(out)
+
+
+def wrap_section(name, body):
+    # markers for writers that stream a section straight to a file
+    return SECTION_START.format(name) + "\n" + body, SECTION_END.format(name) + "\n"
+
+
+def split_row(line):
+    # split one markdown table row into cells, escaped \| stays inside a cell
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip() for cell in CELL_SPLIT_RE.split(line)]
+
+
+class MarkdownTable(object):
+    """
+    a ranking table as a header and rows of cells, columns addressed by name
+    """
+
+    def __init__(self, header, rows):
+        self.header = [COLUMN_ALIASES.get(col, col) for col in header]
+        self.rows = rows
+        self.dedupe_columns()
+
+    @classmethod
+    def parse(cls, text):
+        lines = [line for line in text.splitlines() if line.strip()]
+        header = split_row(lines[0])
+        rows = [split_row(line) for line in lines[2:]]
+        return cls(header, rows)
+
+    def dedupe_columns(self):
+        # keep the first occurrence of every column, drop repeats from older runs
+        keep = []
+        seen = set()
+        for i, col in enumerate(self.header):
+            if col not in seen:
+                seen.add(col)
+                keep.append(i)
+        if len(keep) == len(self.header):
+            return
+        self.header = [self.header[i] for i in keep]
+        self.rows = [[row[i] for i in keep if i < len(row)] for row in self.rows]
+
+    def column(self, name):
+        if name not in self.header:
+            return None
+        idx = self.header.index(name)
+        return [row[idx] if idx < len(row) else "" for row in self.rows]
+
+    def set_column(self, name, values):
+        """
+        set every cell of a column, the column is created at its RANKING_COLUMNS
+        position if missing, so running this twice never adds it twice
+        """
+        if name not in self.header:
+            pos = len(self.header)
+            if name in RANKING_COLUMNS:
+                before = RANKING_COLUMNS[: RANKING_COLUMNS.index(name)]
+                present = [self.header.index(c) for c in before if c in self.header]
+                pos = max(present) + 1 if present else 0
+            self.header.insert(pos, name)
+            for row in self.rows:
+                row.insert(pos, "")
+        idx = self.header.index(name)
+        for row, value in zip(self.rows, values):
+            while len(row) <= idx:
+                row.append("")
+            row[idx] = "" if value is None else str(value)
+
+    def render(self):
+        sep = ["-" * max(len(col), 3) for col in self.header]
+        lines = ["| " + " | ".join(self.header) + " |", "| " + " | ".join(sep) + " |"]
+        for row in self.rows:
+            lines.append("| " + " | ".join(row) + " |")
+        return "\n".join(lines) + "\n"
+
+
+def is_table_line(line):
+    return line.lstrip().startswith("|")
+
+
+def patch_tables(text, func, header_contains="Project Name"):
+    """
+    apply func(MarkdownTable) to every table in text whose header contains
+    `header_contains`, and splice the rendered tables back
+    """
+    lines = text.splitlines(keepends=True)
+    out = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if is_table_line(line) and header_contains in line:
+            j = i
+            while j < len(lines) and is_table_line(lines[j]):
+                j += 1
+            table = MarkdownTable.parse("".join(lines[i:j]))
+            func(table)
+            out.append(table.render())
+            i = j
+        else:
+            out.append(line)
+            i += 1
+    return "".join(out)
+
+
+def iter_tables(text, header_contains="Project Name"):
+    # yield every ranking table in text as a MarkdownTable
+    tables = []
+    patch_tables(text, tables.append, header_contains)
+    return tables
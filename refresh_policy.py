@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+tiered refresh: busy lists daily, stable lists weekly
+
+churn of a list is the share of its repos that were not in the previous
+fetch, per day. it is bootstrapped from the Data/*.csv history and then
+updated after every real fetch (a reused list copied into the next snapshot
+would otherwise look perfectly stable). lists that are not due are served
+from the latest snapshot, so enabling every language costs API points only
+for the lists that actually move
+"""
+import calendar
+import json
+import os
+import time
+
+from snapshots import list_snapshots, load_snapshot_repos, mark_reused
+
+DAY = 24 * 3600
+
+
+def date_ts(date):
+    # "2024-05-01" -> unix time of midnight UTC
+    return calendar.timegm(time.strptime(date, "%Y-%m-%d"))
+
+
+def read_members(path):
+    # {item: [repo_url, ...]} of the lists actually fetched for one snapshot
+    return {
+        item: [repo["html_url"] for repo in repos]
+        for item, repos in load_snapshot_repos(path).items()
+        if repos and repos[0].get("refreshed", True)
+    }
+
+
+def churn(previous, current):
+    # share of current members that were not in previous
+    if not current:
+        return 0.0
+    previous = set(previous)
+    return sum(url not in previous for url in current) / len(current)
+
+
+class RefreshPolicy(object):
+    def __init__(
+        self,
+        data_dir="../Data",
+        state_path=None,
+        daily_churn=0.02,
+        history=7,
+        slack=2 * 3600,
+    ):
+        """
+        state_path: churn state, refresh-state.json in data_dir by default
+        daily_churn: churn per day from which a list is refreshed daily
+        history: snapshot pairs used to bootstrap a list without state
+        slack: a list is due this long before its interval is over, so a
+        daily cron that starts a bit earlier than yesterday still refreshes
+        """
+        self.data_dir = data_dir
+        self.state_path = state_path or os.path.join(data_dir, "refresh-state.json")
+        self.daily_churn = daily_churn
+        self.history = history
+        self.slack = slack
+        self.state = {}  # item -> {"last_fetched", "churn", "urls"}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.snapshot = None
+        self.snapshot_lists = None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def bootstrap(self, items):
+        """
+        churn per day of lists without state, from the last `history`
+        snapshot pairs, written when every list was still fetched every run
+        """
+        missing = [item for item in items if item not in self.state]
+        snapshots = list_snapshots(self.data_dir)[-(self.history + 1) :]
+        if not missing or len(snapshots) < 2:
+            return
+        members = [(date, read_members(path)) for date, path in snapshots]
+        for item in missing:
+            rates = []
+            for (d0, m0), (d1, m1) in zip(members, members[1:]):
+                if item in m0 and item in m1:
+                    days = max((date_ts(d1) - date_ts(d0)) / DAY, 1)
+                    rates.append(churn(m0[item], m1[item]) / days)
+            if rates:
+                last_date, last_members = members[-1]
+                self.state[item] = {
+                    "last_fetched": date_ts(last_date),
+                    "churn": sum(rates) / len(rates),
+                    "urls": last_members.get(item, []),
+                }
+
+    def interval(self, item):
+        entry = self.state.get(item)
+        if entry is None or entry["churn"] >= self.daily_churn:
+            return DAY
+        return 7 * DAY
+
+    def is_due(self, item, now=None):
+        now = time.time() if now is None else now
+        entry = self.state.get(item)
+        if entry is None:
+            return True
+        return now - entry["last_fetched"] >= self.interval(item) - self.slack
+
+    def reuse(self, item, now=None):
+        """
+        the latest snapshot's copy of a list that is not due, None when it
+        has to be fetched
+        """
+        if self.is_due(item, now):
+            return None
+        if self.snapshot_lists is None:
+            snapshots = list_snapshots(self.data_dir)
+            self.snapshot = snapshots[-1][1] if snapshots else None
+            self.snapshot_lists = load_snapshot_repos(self.snapshot) if self.snapshot else {}
+        repos = self.snapshot_lists.get(item)
+        return mark_reused(repos) if repos is not None else None
+
+    def record(self, item, repos, now=None):
+        """
+        update churn after a real fetch, as a moving average of churn per day
+        """
+        now = time.time() if now is None else now
+        urls = [repo["html_url"] for repo in repos]
+        entry = self.state.get(item)
+        if entry is not None:
+            days = max((now - entry["last_fetched"]) / DAY, 1)
+            rate = churn(entry["urls"], urls) / days
+            entry["churn"] = round(0.5 * entry["churn"] + 0.5 * rate, 4)
+            entry["urls"] = urls
+            entry["last_fetched"] = now
+        else:
+            # first fetch without history, daily until a second fetch measures it
+            self.state[item] = {"last_fetched": now, "churn": 1.0, "urls": urls}
+
+    def summary(self):
+        daily = sorted(item for item in self.state if self.interval(item) == DAY)
+        weekly = sorted(item for item in self.state if self.interval(item) != DAY)
+        return f"daily: {', '.join(daily) or '-'}; weekly: {', '.join(weekly) or '-'}"
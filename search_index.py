@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+inverted index over repo names and descriptions
+
+terms come from the repo name (split on -, _, . and camelCase) and the
+description; every query term is matched as a prefix, documents must match
+all terms, and the score is a tf-idf sum boosted by log(stars)
+the index is updated incrementally from each snapshot and saved as gzip json
+"""
+import bisect
+import gzip
+import json
+import math
+import os
+import re
+
+from snapshots import list_snapshots, load_snapshot_records, repo_key
+
+TOKEN_RE = re.compile(r"[0-9a-z]+")
+CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])")
+NAME_WEIGHT = 3  # a hit in the repo name counts like three in the description
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(CAMEL_RE.sub(r"\1 \2", text).lower())
+
+
+class SearchIndex(object):
+    """
+    docs: key -> [name, url, stars, language, description, {term: weight}]
+    postings: term -> set of keys, terms: sorted list for prefix lookups
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        self.terms = []
+        self._terms_dirty = False
+        self.snapshots = {}  # file name -> [mtime, size] when it was merged
+
+    def doc_terms(self, name, description):
+        weights = {}
+        for term in tokenize(name):
+            weights[term] = weights.get(term, 0) + NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] = weights.get(term, 0) + 1
+        return weights
+
+    def add(self, key, name, url, stars, language, description):
+        """
+        insert or update one repo, postings only change when the text changed
+        """
+        old = self.docs.get(key)
+        if old is not None and old[0] == name and old[4] == description:
+            old[2], old[3] = stars, language
+            return False
+        weights = self.doc_terms(name, description)
+        if old is not None:
+            for term in old[5]:
+                if term not in weights:
+                    self._unpost(term, key)
+        for term in weights:
+            keys = self.postings.get(term)
+            if keys is None:
+                self.postings[term] = keys = set()
+                self._terms_dirty = True
+            keys.add(key)
+        self.docs[key] = [name, url, stars, language, description, weights]
+        return True
+
+    def _unpost(self, term, key):
+        keys = self.postings.get(term)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.postings[term]
+            self._terms_dirty = True
+
+    def add_snapshot(self, path):
+        """
+        merge one Data/github-ranking-*.csv, returns the number of changed docs
+        """
+        changed = 0
+        for record in load_snapshot_records(path):
+            changed += self.add(
+                repo_key(record["url"]),
+                record["name"],
+                record["url"],
+                record["stars"],
+                record["language"],
+                record["description"],
+            )
+        return changed
+
+    def update(self, data_dir):
+        """
+        merge every snapshot of data_dir not merged yet, oldest first, so the
+        newest stars and descriptions win. a snapshot rewritten since it was
+        merged (a second csv run or the daemon on the same day) is merged again
+        returns the number of snapshots merged, stars may have changed even
+        when no text did, so any merge is worth saving
+        """
+        merged = 0
+        for _, path in list_snapshots(data_dir):
+            name = os.path.basename(path)
+            stat = os.stat(path)
+            signature = [stat.st_mtime, stat.st_size]
+            if self.snapshots.get(name) != signature:
+                self.add_snapshot(path)
+                self.snapshots[name] = signature
+                merged += 1
+        return merged
+
+    def expand(self, prefix):
+        # every indexed term starting with prefix, by bisecting the sorted term list
+        if self._terms_dirty:
+            self.terms = sorted(self.postings)
+            self._terms_dirty = False
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\uffff")
+        return self.terms[lo:hi]
+
+    def search(self, query, n=20, language=None):
+        """
+        repos matching every query term (as a prefix), best first
+        """
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+        matched = None
+        expansions = []
+        for qt in query_terms:
+            terms = self.expand(qt)
+            keys = set().union(*(self.postings[t] for t in terms)) if terms else set()
+            matched = keys if matched is None else matched & keys
+            expansions.append(terms)
+            if not matched:
+                return []
+        total = len(self.docs)
+        results = []
+        for key in matched:
+            doc = self.docs[key]
+            if language and (doc[3] or "").lower() != language.lower():
+                continue
+            score = 0.0
+            for terms in expansions:
+                best = 0.0
+                for term in terms:
+                    weight = doc[5].get(term)
+                    if weight:
+                        idf = math.log(1 + total / len(self.postings[term]))
+                        best = max(best, weight * idf)
+                score += best
+            score *= math.log10(10 + doc[2])
+            results.append((score, key))
+        results.sort(reverse=True)
+        return [
+            {
+                "key": key,
+                "name": self.docs[key][0],
+                "url": self.docs[key][1],
+                "stars": self.docs[key][2],
+                "language": self.docs[key][3],
+                "description": self.docs[key][4],
+                "score": round(score, 3),
+            }
+            for score, key in results[:n]
+        ]
+
+    def save(self, path):
+        # postings are rebuilt from the per-doc terms on load, only docs are stored
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {"version": 1, "snapshots": self.snapshots, "docs": self.docs},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index.docs = data["docs"]
+        index.snapshots = data["snapshots"]
+        for key, doc in index.docs.items():
+            for term in doc[5]:
+                index.postings.setdefault(term, set()).add(key)
+        index._terms_dirty = True
+        return index
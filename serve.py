@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+local HTTP query server over the latest ranking snapshot
+
+    GET /top?metric=stars&n=10[&language=Rust][&country=China][&item=top-100-stars]
+    GET /repo/<owner>/<name>
+    GET /health
+
+the snapshot is loaded into in-memory indexes and swapped atomically when a
+newer Data/github-ranking-*.csv (or a rewritten spill dir) shows up
+"""
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from snapshots import latest_snapshot, load_snapshot_records, repo_key, repo_record
+
+METRICS = ("stars", "forks", "issues", "last_commit")
+
+
+def load_spill_records(spill_dir):
+    from spill import SpillStore
+
+    store = SpillStore(spill_dir)
+    for item in store.items():
+        for repo in store.open(item):
+            yield repo_record(item, repo)
+
+
+class RankingIndex(object):
+    """
+    immutable indexes over one snapshot
+    order[metric]: record ids sorted best first, pos[metric]: id -> position in it
+    by_key: "owner/name" -> id, postings: field -> value -> set of ids
+    """
+
+    def __init__(self, records, owners=None, source=None):
+        self.source = source
+        self.loaded_at = time.time()
+        self.records = []
+        self.by_key = {}
+        self.postings = {"language": {}, "country": {}, "item": {}}
+        owners = owners or {}
+        for record in records:
+            key = repo_key(record["url"])
+            idx = self.by_key.get(key)
+            if idx is None:
+                # a repo shows up in several lists, keep one entry listing all of them
+                idx = len(self.records)
+                self.by_key[key] = idx
+                owner = owners.get(record["owner"], {})
+                entry = {k: v for k, v in record.items() if k != "item"}
+                entry.update(
+                    key=key,
+                    lists=[],
+                    country=owner.get("country") or None,
+                    owner_type=owner.get("type") or None,
+                )
+                self.records.append(entry)
+                self._post("language", entry["language"], idx)
+                self._post("country", entry["country"], idx)
+            self.records[idx]["lists"].append(record["item"])
+            self._post("item", record["item"], idx)
+
+        self.order = {}
+        self.pos = {}
+        for metric in METRICS:
+            order = sorted(
+                range(len(self.records)),
+                key=lambda i: self.records[i][metric],
+                reverse=True,
+            )
+            self.order[metric] = order
+            pos = [0] * len(order)
+            for rank, idx in enumerate(order):
+                pos[idx] = rank
+            self.pos[metric] = pos
+
+    def _post(self, field, value, idx):
+        if value:
+            self.postings[field].setdefault(value.lower(), set()).add(idx)
+
+    def lookup(self, key):
+        idx = self.by_key.get(key.lower())
+        return None if idx is None else self.records[idx]
+
+    def top(self, metric="stars", n=10, **filters):
+        """
+        best n records by metric, optionally restricted to language / country / item
+        filters intersect posting sets, smallest first
+        """
+        if metric not in self.order:
+            raise ValueError(f"Unknown metric {metric!r}, choose from {', '.join(METRICS)}")
+        sets = []
+        for field, value in filters.items():
+            if value:
+                sets.append(self.postings[field].get(value.lower(), set()))
+        if not sets:
+            ids = self.order[metric][:n]
+        else:
+            sets.sort(key=len)
+            candidates = sets[0].intersection(*sets[1:])
+            ids = heapq.nsmallest(n, candidates, key=self.pos[metric].__getitem__)
+        return [self.records[i] for i in ids]
+
+
+class IndexHolder(object):
+    """
+    holds the current RankingIndex and rebuilds it when the source changes
+    readers just take `holder.index`, the swap is a single reference assignment
+    """
+
+    def __init__(self, data_dir=None, spill_dir=None, owners=None, poll=5.0):
+        self.data_dir = data_dir
+        self.spill_dir = spill_dir
+        self.owners = owners
+        self.poll = poll
+        self.signature = None
+        self.index = RankingIndex([])
+        self.reload()
+
+    def current_signature(self):
+        # (path, mtime) of what would be loaded, a change triggers a reload
+        if self.spill_dir:
+            paths = glob.glob(os.path.join(self.spill_dir, "*.jsonl"))
+            return tuple(sorted((p, os.path.getmtime(p)) for p in paths))
+        path = latest_snapshot(self.data_dir)
+        return (path, os.path.getmtime(path)) if path else None
+
+    def reload(self):
+        signature = self.current_signature()
+        if signature is None or signature == self.signature:
+            return False
+        if self.spill_dir:
+            records, source = load_spill_records(self.spill_dir), self.spill_dir
+        else:
+            records, source = load_snapshot_records(signature[0]), signature[0]
+        t1 = time.time()
+        self.index = RankingIndex(records, owners=self.owners, source=source)
+        self.signature = signature
+        print(f"Loaded {len(self.index.records)} repos from {source} in {time.time() - t1:.3f}s")
+        return True
+
+    def watch(self):
+        def loop():
+            while True:
+                time.sleep(self.poll)
+                try:
+                    self.reload()
+                except Exception as e:  # keep serving the old index
+                    print(f"Reload failed: {e}")
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+
+def make_handler(holder):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            index = holder.index
+            t1 = time.perf_counter()
+            try:
+                if url.path == "/top":
+                    result = index.top(
+                        metric=query.get("metric", "stars"),
+                        n=int(query.get("n", 10)),
+                        language=query.get("language"),
+                        country=query.get("country"),
+                        item=query.get("item"),
+                    )
+                elif url.path.startswith("/repo/"):
+                    result = index.lookup(url.path[len("/repo/") :])
+                    if result is None:
+                        return self.send_json(404, {"error": "repo not found"})
+                elif url.path == "/health":
+                    result = {
+                        "source": index.source,
+                        "repos": len(index.records),
+                        "loaded_at": index.loaded_at,
+                    }
+                else:
+                    return self.send_json(404, {"error": "unknown endpoint"})
+            except ValueError as e:
+                return self.send_json(400, {"error": str(e)})
+            took_ms = (time.perf_counter() - t1) * 1000
+            self.send_json(200, {"took_ms": round(took_ms, 3), "result": result})
+
+        def log_message(self, format, *args):
+            pass  # a dashboard polls often, keep the console quiet
+
+    return Handler
+
+
+def serve(holder, host="127.0.0.1", port=8000):
+    holder.watch()
+    server = ThreadingHTTPServer((host, port), make_handler(holder))
+    print(f"Serving rankings on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+the Data/github-ranking-*.csv snapshots: listing them, reading them back as
+parse_gql_result records or as the flat records serve and search index use
+stdlib only, so light modules (serve, search, refresh policy) can use it
+without pulling in pandas / numpy
+"""
+import csv
+import glob
+import os
+import re
+
+SNAPSHOT_GLOB = "github-ranking-*.csv"
+SNAPSHOT_RE = re.compile(r"github-ranking-(\d{4}-\d{2}-\d{2})\.csv$")
+
+
+def list_snapshots(data_dir="../Data"):
+    """
+    return [(date, path)] of every ranking snapshot, oldest first
+    """
+    snapshots = []
+    for path in glob.glob(os.path.join(data_dir, SNAPSHOT_GLOB)):
+        m = SNAPSHOT_RE.search(path)
+        if m:
+            snapshots.append((m.group(1), path))
+    return sorted(snapshots)
+
+
+def latest_snapshot(data_dir="../Data"):
+    snapshots = list_snapshots(data_dir)
+    return snapshots[-1][1] if snapshots else None
+
+
+def load_snapshot_repos(path):
+    """
+    read a Data/github-ranking-*.csv back into {item: repos}, in the
+    parse_gql_result record shape, so a saved snapshot can stand in for a fetch
+    a column that is empty for a whole list was not fetched (field profile,
+    REST bucket), it is left out of that list's records like parse_gql_result does
+    records of rows that were themselves copied from an older snapshot carry
+    "refreshed": False, see mark_reused
+    """
+    # csv column -> (record key, parse)
+    optional = [
+        ("forks", "forks_count", lambda v: int(float(v))),
+        ("language", "language", str),
+        ("issues", "open_issues_count", lambda v: int(float(v))),
+        ("last_commit", "pushed_at", str),
+        ("description", "description", str),
+    ]
+    rows_by_item = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            rows_by_item.setdefault(row["item"], []).append(row)
+    lists = {}
+    for item, rows in rows_by_item.items():
+        fetched = [col for col in optional if any(row[col[0]] for row in rows)]
+        repos = []
+        for row in rows:
+            repo = {
+                "name": row["repo_name"],
+                "stargazers_count": int(float(row["stars"] or 0)),
+                "html_url": row["repo_url"],
+                "owner": {
+                    "login": row["username"],
+                },
+            }
+            for column, key, parse in fetched:
+                repo[key] = parse(row[column]) if row[column] else None
+            if row.get("refreshed") == "False":
+                repo["refreshed"] = False
+            repos.append(repo)
+        lists[item] = repos
+    return lists
+
+
+def mark_reused(repos):
+    """
+    copies of repos taken from a snapshot instead of fetched, WriteFile writes
+    them with refreshed=False so history readers can skip their stale counts
+    """
+    return [dict(repo, refreshed=False) for repo in repos]
+
+
+def drop_reused(df):
+    """
+    drop the refreshed=False rows of a snapshot frame read with pandas, and the
+    column itself; snapshots written before the column existed are kept whole
+    """
+    if "refreshed" not in df.columns:
+        return df
+    return df[df["refreshed"].astype(str) != "False"].drop(columns="refreshed")
+
+
+def repo_key(repo_url):
+    # "https://github.com/owner/name" -> "owner/name", case-insensitive like GitHub
+    return "/".join(repo_url.rstrip("/").split("/")[-2:]).lower()
+
+
+def repo_record(item, repo):
+    # parse_gql_result record -> flat index record
+    return {
+        "item": item,
+        "name": repo["name"],
+        "url": repo["html_url"],
+        "owner": repo["owner"]["login"],
+        "stars": repo.get("stargazers_count") or 0,
+        "forks": repo.get("forks_count") or 0,
+        "issues": repo.get("open_issues_count") or 0,
+        "language": repo.get("language"),
+        "last_commit": repo.get("pushed_at") or "",
+        "description": repo.get("description"),
+    }
+
+
+def load_snapshot_records(path):
+    for item, repos in load_snapshot_repos(path).items():
+        for repo in repos:
+            yield repo_record(item, repo)
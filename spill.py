@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from itertools import islice
+
+
+class SpilledList(object):
+    """
+    read-only, list-like view over one spilled ranking list
+    records are streamed from disk on every iteration, nothing is kept in memory
+    """
+
+    def __init__(self, path, count=None):
+        self.path = path
+        self._count = count
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def __len__(self):
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+    def __getitem__(self, key):
+        # only slices are supported (data[:10] in the writers), an index
+        # is served by streaming up to it
+        if isinstance(key, slice):
+            if key.step not in (None, 1) or (key.start or 0) < 0 or (
+                key.stop is not None and key.stop < 0
+            ):
+                return list(self)[key]
+            return list(islice(self, key.start or 0, key.stop))
+        if key < 0:
+            return list(self)[key]
+        for repo in islice(self, key, key + 1):
+            return repo
+        raise IndexError("spilled list index out of range")
+
+    def chunks(self, size):
+        """
+        yield lists of at most `size` records
+        """
+        it = iter(self)
+        while True:
+            chunk = list(islice(it, size))
+            if not chunk:
+                return
+            yield chunk
+
+    def __repr__(self):
+        return f"SpilledList({self.path!r}, {len(self)} repos)"
+
+
+class SpillStore(object):
+    """
+    one JSON-lines file per ranking list (item) under spill_dir
+    pages are appended to a side file as they are fetched and commit() swaps
+    it in, so readers (serve.py reloads) only ever see complete lists
+    """
+
+    def __init__(self, spill_dir):
+        self.spill_dir = spill_dir
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def path(self, item):
+        return os.path.join(self.spill_dir, f"{item}.jsonl")
+
+    def part_path(self, item):
+        return self.path(item) + ".part"
+
+    def reset(self, item):
+        # start a list from scratch, a new crawl must not extend the old one
+        # the previous list stays readable until commit
+        open(self.part_path(item), "w", encoding="utf-8").close()
+
+    def append(self, item, repos):
+        with open(self.part_path(item), "a", encoding="utf-8") as f:
+            for repo in repos:
+                f.write(json.dumps(repo, ensure_ascii=False))
+                f.write("\n")
+
+    def commit(self, item):
+        # publish the list written since reset in one atomic rename
+        os.replace(self.part_path(item), self.path(item))
+
+    def open(self, item):
+        return SpilledList(self.path(item))
+
+    def exists(self, item):
+        return os.path.exists(self.path(item))
+
+    def items(self):
+        return sorted(
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.spill_dir)
+            if name.endswith(".jsonl")
+        )
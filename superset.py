@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+several rankings from one superset fetch
+
+the stars and forks searches return largely the same repos. this mode pages
+the stars search once, deeper (up to the 1000 results search allows), and
+derives every ranking from that superset with heapq.nlargest.
+
+a derived list is exact when nothing outside the superset could enter it:
+with t the list's threshold (its last value), a count-only search for
+"metric >= t" over all of GitHub must find no more repos than the superset
+holds at or above t. the stars list needs no check, the superset is the head
+of its own search. a list that fails the check falls back to its own fetch
+when it has a search of its own, and is marked approximate otherwise (there
+is no search qualifier for open issues, and no sort for last push)
+"""
+import heapq
+import json
+import os
+
+from common import get_repository_count
+from process import languages, languages_md
+
+SEARCH_CAP = 1000  # results a single search can page through
+DEPTH = 3  # superset pages per page a single list needs
+
+
+def by_stars(repo):
+    return repo["stargazers_count"]
+
+
+def by_forks(repo):
+    return repo.get("forks_count") or 0
+
+
+def by_issues(repo):
+    return repo.get("open_issues_count") or 0
+
+
+def by_pushed(repo):
+    return repo.get("pushed_at") or ""
+
+
+def language_name(lang_md):
+    # "C\+\+" -> "c++", languages_md unescaped is the primaryLanguage name
+    return lang_md.replace("\\", "").lower()
+
+
+class SupersetRanker(object):
+    def __init__(self, processor, pages=None, fallback=True):
+        """
+        processor: ProcessorGQL, its stars search is the superset
+        pages: superset pages of processor.bulk_size, by default DEPTH times
+        the pages of one list, at most the search cap
+        fallback: fetch lists that fail the exactness check on their own,
+        instead of keeping them marked approximate
+        """
+        self.processor = processor
+        self.pages = min(
+            pages or DEPTH * processor.bulk_count, SEARCH_CAP // processor.bulk_size
+        )
+        self.fallback = fallback
+        self.n = processor.bulk_size * processor.bulk_count
+        self.size = 0  # repos in the fetched superset
+        self.notes = {}  # item -> note of an approximate list
+
+    def fetch_superset(self):
+        search = self.processor.search_stars
+        print(f"Get superset of {self.pages * self.processor.bulk_size} repos: {search}")
+        pages = self.processor.iter_gql_pages(self.processor.gql_for(search, "full"), self.pages)
+        superset = {}
+        for page in pages:
+            for repo in page:
+                superset.setdefault(repo["html_url"], repo)
+        self.size = len(superset)
+        return list(superset.values())
+
+    def derive(self, candidates, key, certificate=None):
+        """
+        top n of candidates by key, and whether it is provably the global top n
+        certificate: threshold -> search matching every repo at or above it
+        """
+        top = heapq.nlargest(self.n, candidates, key=key)
+        # a short list is cut off by the superset's own star bound, so the count
+        # below would agree with it while repos under that bound are missing
+        if certificate is None or len(top) < self.n:
+            return top, False
+        threshold = key(top[-1])
+        local = sum(1 for repo in candidates if key(repo) >= threshold)
+        count = get_repository_count(certificate(threshold))
+        # a failed count proves nothing
+        return top, count is not None and count <= local
+
+    def resolve(self, item, derived, search=None, ranked="ranked"):
+        """
+        keep an exact list, else fetch it on its own or mark it approximate
+        ranked: what the list ranks by, for the note of an approximate list
+        """
+        top, exact = derived
+        if exact:
+            print(f"{item}: exact from the superset")
+        elif search is not None and (self.fallback or not top):
+            # an empty approximate list says nothing, fetch it even with fallback off
+            print(f"{item}: not provably exact, fetching it on its own")
+            return self.processor.fetch_list(search, item)
+        else:
+            self.notes[item] = (
+                f"Approximate: {ranked} among the {self.size} most starred repositories"
+                " on GitHub, not checked against all of them."
+            )
+            print(f"{item}: approximate")
+        repos = self.processor.collect([top], item)
+        if self.processor.activity is not None:
+            repos = self.processor.add_activity(repos, item)
+        return repos
+
+    def get_all_repos(self):
+        """
+        get_all_repos of ProcessorGQL plus the EXTRA_LISTS, as
+        (repos_stars, repos_forks, repos_languages, extra_lists)
+        """
+        processor = self.processor
+        superset = self.fetch_superset()
+        base = processor.search_stars.replace("sort:stars", "").strip()
+
+        # the superset is the head of the stars search itself, exact without a count
+        top_stars = heapq.nlargest(self.n, superset, key=by_stars)
+        repos_stars = self.resolve(
+            "top-100-stars",
+            (top_stars, len(top_stars) >= self.n or self.size < self.pages * processor.bulk_size),
+            processor.search_stars,
+        )
+        repos_forks = self.resolve(
+            "top-100-forks",
+            self.derive(superset, by_forks, lambda t: f"forks:>={t}"),
+            processor.search_forks,
+            "most forked",
+        )
+        repos_languages = {}
+        for lang, lang_md in zip(languages, languages_md):
+            name = language_name(lang_md)
+            candidates = [r for r in superset if (r.get("language") or "").lower() == name]
+            repos_languages[lang] = self.resolve(
+                lang,
+                self.derive(candidates, by_stars, lambda t: f"language:{lang} stars:>={t}"),
+                processor.search_stars_lang % lang,
+                f"most starred {lang_md} repositories",
+            )
+        extra_lists = {
+            "top-100-issues": self.resolve(
+                "top-100-issues", self.derive(superset, by_issues), ranked="most open issues"
+            ),
+            # same universe as the superset search, so "recently active" means
+            # among repos over its star bound
+            "recently-active": self.resolve(
+                "recently-active",
+                self.derive(superset, by_pushed, lambda t: f"{base} pushed:>={t}"),
+                ranked="most recently pushed",
+            ),
+        }
+        return repos_stars, repos_forks, repos_languages, extra_lists
+
+    def save_notes(self, spill_dir):
+        # read back by process.load_spilled_notes, notes of every list
+        with open(os.path.join(spill_dir, "superset.json"), "w", encoding="utf-8") as f:
+            json.dump(self.notes, f)
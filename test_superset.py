@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import superset
+from superset import SupersetRanker, by_stars
+
+
+class FakeProcessor(object):
+    bulk_size = 50
+    bulk_count = 2
+
+
+def make_repos(stars, language="Python"):
+    return [
+        {"html_url": f"https://github.com/o/r{i}", "stargazers_count": s, "language": language}
+        for i, s in enumerate(stars)
+    ]
+
+
+def test_derive_short_list_is_not_exact(monkeypatch):
+    # the count would agree, but 60 < n repos cannot be the whole top n
+    monkeypatch.setattr(superset, "get_repository_count", lambda search: 60)
+    ranker = SupersetRanker(FakeProcessor())
+    top, exact = ranker.derive(make_repos(range(1000, 1060)), by_stars, lambda t: f"stars:>={t}")
+    assert len(top) == 60
+    assert not exact
+
+
+def test_derive_full_list_is_certified_by_count(monkeypatch):
+    ranker = SupersetRanker(FakeProcessor())
+    candidates = make_repos(range(1000, 1150))
+    certificate = lambda t: f"stars:>={t}"
+
+    monkeypatch.setattr(superset, "get_repository_count", lambda search: 100)
+    assert ranker.derive(candidates, by_stars, certificate) == (
+        sorted(candidates, key=by_stars, reverse=True)[:100],
+        True,
+    )
+    monkeypatch.setattr(superset, "get_repository_count", lambda search: 101)
+    assert not ranker.derive(candidates, by_stars, certificate)[1]
+    monkeypatch.setattr(superset, "get_repository_count", lambda search: None)
+    assert not ranker.derive(candidates, by_stars, certificate)[1]
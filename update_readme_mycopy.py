@@ -1,23 +1,41 @@
+import os
+import random
 import re
-import requests
+import threading
 import time
-import os
-from dotenv import load_dotenv
-
-load_dotenv() # Load environment variables from .env file
+from concurrent.futures import ThreadPoolExecutor
+from readme_doc import ReadmeDocument, iter_tables, patch_tables
 
 # --- Configuration ---
 README_FILE = "README.md"
 GITHUB_API_URL = "https://api.github.com"
 # Consider setting a GitHub Personal Access Token as an environment variable
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-HEADERS = {"Authorization": f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
+GITHUB_TOKEN = None
+HEADERS = None
+
+
+def get_headers():
+    """
+    load the token once, on first use instead of at import time
+    """
+    global GITHUB_TOKEN, HEADERS
+    if HEADERS is not None:
+        return HEADERS
+    try:
+        from dotenv import load_dotenv
+
+        load_dotenv() # Load environment variables from .env file
+    except ImportError:
+        pass
+    GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+    HEADERS = {"Authorization": f"token {GITHUB_TOKEN}"} if GITHUB_TOKEN else {}
 
-print(f"Using GITHUB_TOKEN: {'Yes' if GITHUB_TOKEN else 'No'}")
-if GITHUB_TOKEN:
-    print(f"Headers configured: {{'Authorization': 'token <redacted>'}}")
-else:
-    print("No GITHUB_TOKEN found, requests will be unauthenticated.")
+    print(f"Using GITHUB_TOKEN: {'Yes' if GITHUB_TOKEN else 'No'}")
+    if GITHUB_TOKEN:
+        print(f"Headers configured: {{'Authorization': 'token <redacted>'}}")
+    else:
+        print("No GITHUB_TOKEN found, requests will be unauthenticated.")
+    return HEADERS
 
 # Simple city to country mapping (can be expanded)
 CITY_TO_COUNTRY = {
@@ -116,48 +134,132 @@ COMMON_COUNTRIES = [
 ]
 
 OWNER_CACHE = {}
+MAX_WORKERS = 8 # Concurrent owner lookups
+MAX_RETRIES = 3
+MAX_BACKOFF = 10 # Never wait longer than this for a rate limit reset, in seconds
+
+_inflight = {} # owner login -> Future of the lookup in progress
+_inflight_lock = threading.Lock()
+_rate_limited_until = 0 # While the quota is drained, lookups are skipped without a request
+
+
+class RateLimited(Exception):
+    def __init__(self, message, wait):
+        super().__init__(message)
+        self.wait = wait
+
+
+def get_with_backoff(session, url, headers):
+    """
+    GET with a bounded, non-recursive retry on rate limits (403/429)
+    waits Retry-After / X-RateLimit-Reset when it is short, otherwise gives up
+    """
+    for attempt in range(MAX_RETRIES):
+        response = session.get(url, headers=headers, timeout=5)
+        if response.status_code not in (403, 429) or "rate limit" not in response.text.lower():
+            return response
+        if "Retry-After" in response.headers:
+            wait = float(response.headers["Retry-After"])
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            wait = float(response.headers.get("X-RateLimit-Reset", 0)) - time.time()
+        else:
+            wait = 2 ** attempt # secondary rate limit without a hint
+        if wait > MAX_BACKOFF:
+            raise RateLimited(f"rate limited for {wait:.0f}s more", wait)
+        time.sleep(max(wait, 0) + random.uniform(0, 0.5))
+    raise RateLimited(f"still rate limited after {MAX_RETRIES} attempts", MAX_BACKOFF)
+
 
 def get_owner_data(owner_login):
+    """
+    owner type and location of a login, cached for the process
+    returns None when the owner could not be looked up (rate limit, network
+    or server error), so callers keep what they already have for it
+    """
+    global _rate_limited_until
     if owner_login in OWNER_CACHE:
         return OWNER_CACHE[owner_login]
+    if time.time() < _rate_limited_until:
+        return None
+
+    import requests
 
+    from common import get_session
+
+    session = get_session()
+    headers = get_headers()
     data = {"type": "Unknown", "location": None, "country": "Unknown"}
 
     # Try as a user
     user_url = f"{GITHUB_API_URL}/users/{owner_login}"
     try:
-        response = requests.get(user_url, headers=HEADERS, timeout=5)
+        response = get_with_backoff(session, user_url, headers)
         if response.status_code == 200:
             user_data = response.json()
             data["type"] = "User"
             data["location"] = user_data.get("location")
-            OWNER_CACHE[owner_login] = data
-            time.sleep(0.1) # Be gentle with the API
-            return data
         elif response.status_code == 404:
             # Not a user, try as an organization
             org_url = f"{GITHUB_API_URL}/orgs/{owner_login}"
-            response = requests.get(org_url, headers=HEADERS, timeout=5)
+            response = get_with_backoff(session, org_url, headers)
             if response.status_code == 200:
                 org_data = response.json()
                 data["type"] = "Organization"
                 data["location"] = org_data.get("location")
-                OWNER_CACHE[owner_login] = data
-                time.sleep(0.1) # Be gentle with the API
-                return data
-            elif response.status_code == 403 and 'rate limit exceeded' in response.text:
-                print("GitHub API rate limit exceeded. Please try again later or provide a GITHUB_TOKEN.")
-                time.sleep(60) # Wait for a minute and retry
-                return get_owner_data(owner_login) # Retry after waiting
+            elif response.status_code != 404:
+                print(f"Error fetching data for {owner_login}: {response.status_code} - {response.text}")
+                return None
         else:
             print(f"Error fetching data for {owner_login}: {response.status_code} - {response.text}")
-
+            return None
+    except RateLimited as e:
+        # Not cached, a later run can still resolve this owner
+        _rate_limited_until = time.time() + e.wait
+        print(f"GitHub API {e}, skipping {owner_login}. Provide a GITHUB_TOKEN for a higher limit.")
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Network error or timeout for {owner_login}: {e}")
+        return None
 
-    OWNER_CACHE[owner_login] = data # Cache even if unknown to avoid repeated requests
+    OWNER_CACHE[owner_login] = data # Cache even if unknown (no such user or org) to avoid repeated requests
     return data
 
+
+def submit_owner(executor, owner_login):
+    """
+    one lookup per login at a time, concurrent callers share the same Future
+    """
+    with _inflight_lock:
+        future = _inflight.get(owner_login)
+        if future is None:
+            future = executor.submit(get_owner_data, owner_login)
+            _inflight[owner_login] = future
+            future.add_done_callback(lambda f: _inflight.pop(owner_login, None))
+        return future
+
+
+def resolve_owners(owner_logins, max_workers=MAX_WORKERS):
+    """
+    resolve every unique, uncached login with a bounded thread pool
+    returns {login: data} of the logins that could be resolved, the rest
+    (rate limited, errors) are left out
+    """
+    owners = {login: OWNER_CACHE[login] for login in owner_logins if login in OWNER_CACHE}
+    pending = set(owner_logins) - set(owners)
+    if not pending:
+        return owners
+    print(f"Resolving {len(pending)} owners with {max_workers} workers...")
+    get_headers()  # load the token here, the workers only read HEADERS
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {login: submit_owner(executor, login) for login in pending}
+        for login, future in futures.items():
+            data = future.result()
+            if data is not None:
+                owners[login] = data
+    if len(owners) < len(set(owner_logins)):
+        print(f"{len(set(owner_logins)) - len(owners)} owners not resolved, their cells are kept")
+    return owners
+
 def infer_country_from_location(location):
     if not location:
         return "Unknown"
@@ -180,145 +282,57 @@ def infer_country_from_location(location):
             
     return "Unknown"
 
-def update_readme_table(readme_content):
-    lines = readme_content.splitlines()
-    updated_lines = []
-    
-    header_index = -1
-    new_columns_present = False # Initialize here
-    
-    # Step 1: Find the table header and extract column names
-    for i, line in enumerate(lines):
-        if "| Ranking | Project Name |" in line:
-            header_index = i
-            break
-            
-    if header_index == -1:
-        return readme_content # Table not found
-
-    # Extract column names from the header line
-    header_line = lines[header_index].strip()
-    header_columns = [col.strip() for col in header_line.split('|') if col.strip()]
-
-    # Check if "Owner Type" and "Country" are already present in the header
-    new_columns_present = "Owner Type" in header_columns and "Country" in header_columns
-    
-    # Find insertion point for "Owner Type" and "Country"
-    insert_at_idx = -1 # Initialize to a safe default
-    
-    try:
-        open_issues_idx = header_columns.index("Open Issues")
-        # description_idx = header_columns.index("Description") # Not directly used for insertion point anymore
-        
-        # Determine the insertion index based on whether columns are new or existing
-        if not new_columns_present:
-            insert_at_idx = open_issues_idx + 1 # Insert after Open Issues
-        else:
-            # If columns are present, find the index of "Owner Type"
-            insert_at_idx = header_columns.index("Owner Type")
-            
-    except ValueError:
-        print("Error: 'Open Issues' or 'Description' column not found in header. Cannot insert new columns.")
-        return readme_content
-
-    # Check if "Owner Type" and "Country" are already present in the header
-    # This check needs to be done *after* potentially getting insert_at_idx for existing columns
-    # because header_columns might contain them already.
-    # Re-evaluate new_columns_present after all parsing
-    new_columns_present = "Owner Type" in header_columns and "Country" in header_columns
-    
-    # Step 2: Reconstruct lines before the table
-    updated_lines.extend(lines[:header_index])
-
-    # Step 3: Construct new header and separator lines
-    new_header_columns = list(header_columns) # Create a mutable copy
-    if not new_columns_present:
-        # Insert "Owner Type" and "Country" after "Open Issues"
-        new_header_columns.insert(insert_at_idx, "Owner Type")
-        new_header_columns.insert(insert_at_idx + 1, "Country")
-    # If new_columns_present is true, new_header_columns already contains them in the right order
-    # so no insertion is needed, just use new_header_columns as is.
-    
-    updated_header_line = "| " + " | ".join(new_header_columns) + " |"
-    updated_lines.append(updated_header_line)
-
-    # Construct the new separator line based on the new header
-    separator_line = lines[header_index + 1].strip()
-    separator_parts = [part.strip() for part in separator_line.split('|') if part.strip()]
-    
-    new_separator_parts = list(separator_parts)
-    if not new_columns_present:
-        new_separator_parts.insert(insert_at_idx, "----------")
-        new_separator_parts.insert(insert_at_idx + 1, "-------")
-    
-    updated_separator_line = "| " + " | ".join(new_separator_parts) + " |"
-    updated_lines.append(updated_separator_line)
-
-    # Step 4: Process data rows
-    data_rows_start_index = header_index + 2
-    for i in range(data_rows_start_index, len(lines)):
-        line = lines[i]
-        if not line.strip().startswith('|'): # End of table data
-            updated_lines.extend(lines[i:])
-            break
-
-        # Process data row
-        match = re.search(r'\[.*?\]\((https://github.com/(.*?)/(.*?))\)', line)
-        
-        # Split the data line into columns
-        current_data_columns = [col.strip() for col in line.split('|') if col.strip()]
-        
-        if match:
-            owner_login = match.group(2)
-            owner_info = get_owner_data(owner_login)
-            owner_type = owner_info["type"]
-            location = owner_info["location"]
-            country = infer_country_from_location(location)
-
-            # Insert or update Owner Type and Country values
-            new_data_columns = list(current_data_columns)
-            
-            # Here, we need to ensure insert_at_idx is correct for data columns as well.
-            # If new_columns_present was true, it means original header had them,
-            # so data rows should also have them, and insert_at_idx is the index of Owner Type.
-            # If not new_columns_present, then we insert at insert_at_idx.
-            
-            # This logic needs to consider the current state of the data row.
-            # A clean way is to always build the data row from its current parsed content,
-            # then insert/replace at the calculated insert_at_idx.
-            
-            # If the current data row already has the new columns, update them.
-            # Otherwise, insert them. The `len(new_header_columns)` check is good.
-            if len(new_data_columns) == len(new_header_columns):
-                # Columns already exist, update them
-                new_data_columns[insert_at_idx] = owner_type
-                new_data_columns[insert_at_idx + 1] = country
-            else:
-                # Columns don't exist, insert them
-                new_data_columns.insert(insert_at_idx, owner_type)
-                new_data_columns.insert(insert_at_idx + 1, country)
-            
-
-            updated_data_line = "| " + " | ".join(new_data_columns) + " |"
-            updated_lines.append(updated_data_line)
-        else:
-            # If no match or other issues, still reconstruct based on new column structure if applicable
-            # Or just append the line as is if it's already in the new format
-            # This also needs insert_at_idx to be robust
-            
-            # If the header changed, and this data row needs to conform to new header's column count
-            if len(current_data_columns) < len(new_header_columns):
-                # Insert empty placeholders to match the column count of the new header
-                empty_fillers = [""] * (len(new_header_columns) - len(current_data_columns))
-                new_data_columns = list(current_data_columns)
-                new_data_columns.insert(insert_at_idx, empty_fillers[0])
-                new_data_columns.insert(insert_at_idx + 1, empty_fillers[1])
-                updated_lines.append("| " + " | ".join(new_data_columns) + " |")
-            else:
-                updated_lines.append(line) # Append original line
-
-
-    return "\n".join(updated_lines)
+OWNER_LINK_RE = re.compile(r'\[.*?\]\((https://github.com/(.*?)/(.*?))\)')
+
+
+def enrich_table(table, owners):
+    """
+    fill Owner Type and Country of one MarkdownTable from resolve_owners'
+    map, the columns are created once at their schema position and only
+    updated on later runs. an owner missing from the map keeps its cells
+    """
+    projects = table.column("Project Name")
+    owner_types = table.column("Owner Type") or [""] * len(projects)
+    countries = table.column("Country") or [""] * len(projects)
+    for idx, project in enumerate(projects):
+        match = OWNER_LINK_RE.search(project)
+        if not match or match.group(2) not in owners:
+            continue
+        owner_info = owners[match.group(2)]
+        owner_types[idx] = owner_info["type"]
+        countries[idx] = infer_country_from_location(owner_info["location"])
+    table.set_column("Owner Type", owner_types)
+    table.set_column("Country", countries)
+
+
+def update_readme_table(readme_content, sections=None):
+    """
+    add or refresh Owner Type and Country in the ranking tables
+    with `sections`, only the tables inside those marked sections are touched
+    """
+    doc = ReadmeDocument(readme_content)
+    if sections is None:
+        tables = iter_tables(readme_content)
+    else:
+        tables = [t for name in sections for t in iter_tables(doc.get_section(name) or "")]
+
+    # Look up every owner once, concurrently, before rewriting anything
+    owner_logins = set()
+    for table in tables:
+        for project in table.column("Project Name") or []:
+            match = OWNER_LINK_RE.search(project)
+            if match:
+                owner_logins.add(match.group(2))
+    owners = resolve_owners(owner_logins)
+
+    def enrich(table):
+        enrich_table(table, owners)
+
+    if sections is None:
+        return patch_tables(readme_content, enrich)
+    for name in sections:
+        doc.patch_section(name, lambda body: patch_tables(body, enrich))
+    return doc.render()
 
 def main():
     print(f"Reading {README_FILE}...")
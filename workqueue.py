@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+durable work queue for a sharded crawl
+
+one SQLite file in a shared directory holds a work item per list, or per
+star/fork range partition of a list. any number of worker processes, on
+this or other machines mounting the same directory, claim items under a
+lease, spill their results next to the queue, and a merger rebuilds the
+lists for WriteFile. an expired lease (crashed worker) puts the item back
+"""
+import os
+import re
+import socket
+import sqlite3
+import time
+from datetime import datetime
+
+from spill import SpillStore
+
+SORT_KEYS = {"stars": "stargazers_count", "forks": "forks_count"}
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    crawl TEXT NOT NULL,
+    item TEXT NOT NULL,
+    part INTEGER NOT NULL,
+    search TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    UNIQUE (crawl, item, part)
+)
+"""
+
+
+def parse_range(qualifier):
+    """
+    value of a stars:/forks: qualifier -> inclusive (lo, hi), None when open
+    ">1000" -> (1001, None), "10..99" -> (10, 99), "<=50" -> (None, 50)
+    """
+    m = re.fullmatch(r"(>=|>|<=|<)?(\d+)(?:\.\.(\d+))?", qualifier)
+    if m is None:
+        return None, None
+    op, value, upper = m.group(1), int(m.group(2)), m.group(3)
+    if upper is not None:
+        return value, int(upper)
+    return {
+        ">": (value + 1, None),
+        ">=": (value, None),
+        "<": (None, value - 1),
+        "<=": (None, value),
+        None: (value, value),
+    }[op]
+
+
+def format_range(lo, hi):
+    if lo is None:
+        return f"<={hi}"
+    if hi is None:
+        return f">={lo}"
+    return f"{lo}..{hi}"
+
+
+def partition_search(search, bounds):
+    """
+    split a "... sort:stars" search into ranges of its sort metric
+    "stars:>1000 sort:stars", [5000] -> ["stars:1001..4999 sort:stars", "stars:>=5000 sort:stars"]
+    the ranges cover every value the search itself matches, so the top-N of the
+    whole list is inside the union of every range's top-N
+    """
+    m = re.search(r"sort:(\w+)", search)
+    if not bounds or not m or m.group(1) not in SORT_KEYS:
+        return [search]
+    metric = m.group(1)
+    own = re.search(r"\b%s:(\S+)" % metric, search)
+    lo, hi = parse_range(own.group(1)) if own else (None, None)
+    base = re.sub(r"\b%s:\S+\s*" % metric, "", search).strip()
+    # bounds outside the search's own range would only add empty partitions
+    cuts = sorted(b for b in set(bounds) if (lo is None or b > lo) and (hi is None or b <= hi))
+    if not cuts:
+        return [search]
+    edges = [lo] + cuts
+    ranges = [format_range(a, b - 1) for a, b in zip(edges, cuts)]
+    ranges.append(format_range(cuts[-1], hi))
+    return [f"{metric}:{r} {base}" for r in ranges]
+
+
+class WorkQueue(object):
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        os.makedirs(queue_dir, exist_ok=True)
+        self.db_path = os.path.join(queue_dir, "queue.sqlite")
+        # rollback journal instead of WAL, WAL needs shared memory that
+        # network file systems do not provide
+        self.conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(SCHEMA)
+
+    def results_store(self, crawl):
+        return SpillStore(os.path.join(self.queue_dir, crawl))
+
+    def enqueue(self, crawl, specs, bounds=None):
+        """
+        specs: [(item, search)], one work item per list and range partition
+        enqueueing the same crawl twice adds nothing
+        """
+        added = 0
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for item, search in specs:
+                for part, part_search in enumerate(partition_search(search, bounds)):
+                    cur = self.conn.execute(
+                        "INSERT OR IGNORE INTO items (crawl, item, part, search) VALUES (?, ?, ?, ?)",
+                        (crawl, item, part, part_search),
+                    )
+                    added += cur.rowcount
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, crawl, worker, lease=900):
+        """
+        atomically take the next pending (or lease-expired) item, None when none left
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                """SELECT * FROM items WHERE crawl = ? AND (status = 'pending'
+                   OR (status = 'claimed' AND lease_until < ?)) ORDER BY id LIMIT 1""",
+                (crawl, now),
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    """UPDATE items SET status = 'claimed', worker = ?, lease_until = ?,
+                       attempts = attempts + 1 WHERE id = ?""",
+                    (worker, now + lease, row["id"]),
+                )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return dict(row) if row is not None else None
+
+    def complete(self, item_id, worker):
+        # only the current lease holder may complete, a late worker is ignored
+        self.conn.execute(
+            "UPDATE items SET status = 'done', error = NULL WHERE id = ? AND worker = ? AND status = 'claimed'",
+            (item_id, worker),
+        )
+
+    def fail(self, item_id, worker, error):
+        self.conn.execute(
+            """UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+               error = ? WHERE id = ? AND worker = ?""",
+            (MAX_ATTEMPTS, str(error), item_id, worker),
+        )
+
+    def retry(self, crawl):
+        """
+        put the items that ran out of attempts back to pending, returns how many
+        """
+        cur = self.conn.execute(
+            """UPDATE items SET status = 'pending', attempts = 0, worker = NULL,
+               lease_until = NULL WHERE crawl = ? AND status = 'failed'""",
+            (crawl,),
+        )
+        return cur.rowcount
+
+    def status(self, crawl):
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) AS n FROM items WHERE crawl = ? GROUP BY status",
+            (crawl,),
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def items(self, crawl):
+        return [
+            dict(row)
+            for row in self.conn.execute(
+                "SELECT * FROM items WHERE crawl = ? ORDER BY id", (crawl,)
+            ).fetchall()
+        ]
+
+
+def part_name(item, part):
+    return f"{item}.part{part}"
+
+
+def run_worker(queue, crawl, processor, worker=None, lease=900):
+    """
+    claim and fetch items until the crawl has nothing left to claim
+    processor is a ProcessorGQL, its fetch_list does the actual paging
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    store = queue.results_store(crawl)
+    processor.store = store
+    done = 0
+    while True:
+        work = queue.claim(crawl, worker, lease=lease)
+        if work is None:
+            break
+        print(f"[{worker}] {work['item']} part {work['part']}: {work['search']}")
+        try:
+            processor.fetch_list(work["search"], part_name(work["item"], work["part"]))
+        except Exception as e:
+            print(f"[{worker}] failed: {e}")
+            queue.fail(work["id"], worker, e)
+            continue
+        queue.complete(work["id"], worker)
+        done += 1
+    print(f"[{worker}] no work left, fetched {done} items")
+    return done
+
+
+def merge(queue, crawl, spill_dir, count):
+    """
+    combine the partitions of every list into spill_dir/<item>.jsonl:
+    dedupe by url, sort by the list's sort metric, keep the top `count`
+    returns False while items are still pending
+    """
+    items = queue.items(crawl)
+    if any(work["status"] != "done" for work in items):
+        print(f"Crawl {crawl} not finished: {queue.status(crawl)}")
+        for work in items:
+            if work["status"] == "failed":
+                print(f"  failed: {work['item']} part {work['part']}: {work['error']}")
+        if any(work["status"] == "failed" for work in items):
+            print("Run 'queue retry' to put the failed items back to pending.")
+        return False
+    results = queue.results_store(crawl)
+    out = SpillStore(spill_dir)
+    by_item = {}
+    for work in items:
+        by_item.setdefault(work["item"], []).append(work)
+    for item, parts in by_item.items():
+        m = re.search(r"sort:(\w+)", parts[0]["search"])
+        key = SORT_KEYS.get(m.group(1) if m else "stars", "stargazers_count")
+        repos = {}
+        for work in parts:
+            for repo in results.open(part_name(item, work["part"])):
+                repos[repo["html_url"]] = repo
+        merged = sorted(repos.values(), key=lambda r: r.get(key) or 0, reverse=True)
+        out.reset(item)
+        out.append(item, merged[:count])
+        out.commit(item)
+    print(f"Merged {len(by_item)} lists of crawl {crawl} into {spill_dir}")
+    return True
+
+
+def default_crawl_id():
+    return datetime.utcnow().strftime("%Y-%m-%d")